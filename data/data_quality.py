@@ -0,0 +1,171 @@
+import sys
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 1_000_000
+STEP_SECONDS = 60              # expected spacing of 1m candles
+SPIKE_MIN_MOVE = 0.02          # never flag a bar under a 2% close to close move
+SPIKE_MAD_MULT = 25            # flag moves above 25x the chunk's median absolute move
+MIN_ZERO_VOLUME_RUN = 5        # bars of zero volume before it is worth reporting
+REPORT_FILE = "data_quality_report.csv"
+
+
+def _runs(mask: np.ndarray):
+    """
+    Start and stop (exclusive) positions of every run of True in mask.
+    """
+    if not mask.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    padded = np.concatenate([[False], mask, [False]]).astype(np.int8)
+    edges = np.diff(padded)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+class CandleValidator:
+    """
+    Single pass validator for time sorted candles, fed one chunk at a time.
+
+    Only the last timestamp, last close and any run still open at the end
+    of a chunk are carried between chunks, so memory does not grow with the
+    number of rows. Problems are reported as ranges, not rows:
+
+        gap         missing bars between two timestamps
+        duplicate   repeated timestamps
+        out_of_order  timestamps that go backwards
+        zero_volume  runs of at least MIN_ZERO_VOLUME_RUN zero volume bars
+        spike        close to close moves far outside the chunk's usual range
+    """
+
+    def __init__(self, step_seconds: int = STEP_SECONDS):
+        self.step = step_seconds
+        self.rows = 0
+        self.ranges = {k: [] for k in ["gap", "duplicate", "out_of_order", "zero_volume", "spike"]}
+        self._last_ts = None
+        self._last_close = None
+        self._open_zero = None      # (start_ts, last_ts, rows) of a zero volume run at chunk end
+
+    def _add(self, kind, start, end, rows):
+        """
+        Append a range, merging it into the previous one when they touch.
+        """
+        ranges = self.ranges[kind]
+        if ranges and start <= ranges[-1][1] + self.step:
+            prev = ranges[-1]
+            ranges[-1] = (prev[0], max(prev[1], end), prev[2] + rows)
+        else:
+            ranges.append((start, end, rows))
+
+    def update(self, df: pd.DataFrame) -> None:
+        if df is None or df.empty:
+            return
+
+        unit = "s" if pd.api.types.is_numeric_dtype(df["time"]) else None
+        t = pd.to_datetime(df["time"], unit=unit, utc=True).values.astype("datetime64[s]").astype(np.int64)
+        close = df["close"].to_numpy(dtype=np.float64)
+        volume = df["volume"].to_numpy(dtype=np.float64) if "volume" in df.columns else None
+
+        prev_t = np.concatenate([[self._last_ts], t[:-1]]) if self._last_ts is not None else t[:-1]
+        cur_t = t if self._last_ts is not None else t[1:]
+        dt = cur_t - prev_t
+
+        for i in np.flatnonzero(dt > self.step):
+            missing = int(dt[i] // self.step) - 1
+            if missing > 0:
+                self._add("gap", int(prev_t[i] + self.step), int(cur_t[i] - self.step), missing)
+        for i in np.flatnonzero(dt == 0):
+            self._add("duplicate", int(cur_t[i]), int(cur_t[i]), 1)
+        for i in np.flatnonzero(dt < 0):
+            self._add("out_of_order", int(cur_t[i]), int(prev_t[i]), 1)
+
+        self._check_spikes(t, close)
+        if volume is not None:
+            self._check_zero_volume(t, volume)
+
+        self._last_ts = int(t[-1])
+        self._last_close = float(close[-1])
+        self.rows += len(t)
+
+    def _check_spikes(self, t, close):
+        carried = self._last_close is not None
+        prev_close = np.concatenate([[self._last_close], close[:-1]]) if carried else close[:-1]
+        cur_close = close if carried else close[1:]
+        cur_t = t if carried else t[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moves = np.abs(np.log(cur_close / prev_close))
+        if len(moves) == 0:
+            return
+        scale = np.nanmedian(moves)
+        threshold = max(SPIKE_MIN_MOVE, SPIKE_MAD_MULT * scale)
+        bad = ~np.isfinite(moves) | (moves > threshold)
+        for s, e in zip(*_runs(bad)):
+            self._add("spike", int(cur_t[s]), int(cur_t[e - 1]), int(e - s))
+
+    def _check_zero_volume(self, t, volume):
+        zero = volume == 0
+        if not zero[0]:
+            self._close_zero_run()
+
+        starts, stops = _runs(zero)
+        for s, e in zip(starts, stops):
+            start_ts, rows = int(t[s]), int(e - s)
+            # continue a run left open by the previous chunk
+            if s == 0 and self._open_zero is not None:
+                start_ts = self._open_zero[0]
+                rows += self._open_zero[2]
+                self._open_zero = None
+            if e == len(t):
+                self._open_zero = (start_ts, int(t[e - 1]), rows)
+                continue
+            if rows >= MIN_ZERO_VOLUME_RUN:
+                self._add("zero_volume", start_ts, int(t[e - 1]), rows)
+
+    def _close_zero_run(self):
+        if self._open_zero is not None and self._open_zero[2] >= MIN_ZERO_VOLUME_RUN:
+            self._add("zero_volume", *self._open_zero)
+        self._open_zero = None
+
+    def finish(self) -> pd.DataFrame:
+        """
+        Close any open run and return every problem range as one frame.
+        """
+        self._close_zero_run()
+        rows = [
+            (kind, start, end, n)
+            for kind, ranges in self.ranges.items()
+            for start, end, n in ranges
+        ]
+        report = pd.DataFrame(rows, columns=["kind", "start", "end", "rows"])
+        report["start"] = pd.to_datetime(report["start"], unit="s")
+        report["end"] = pd.to_datetime(report["end"], unit="s")
+        return report.sort_values(["start", "kind"]).reset_index(drop=True)
+
+    def gap_ranges(self):
+        """
+        Gap ranges as (start, end) UTC aware datetimes, ready to queue for
+        re fetch. Aware so .timestamp() gives the right epoch on any host.
+        """
+        return [
+            (pd.Timestamp(s, unit="s", tz="UTC").to_pydatetime(),
+             pd.Timestamp(e, unit="s", tz="UTC").to_pydatetime())
+            for s, e, _ in self.ranges["gap"]
+        ]
+
+    def summary(self) -> str:
+        counts = {k: len(v) for k, v in self.ranges.items()}
+        return f"{self.rows} rows checked, ranges: {counts}"
+
+
+def validate_csv(path: str, chunk_rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    validator = CandleValidator()
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        validator.update(chunk)
+    report = validator.finish()
+    print(validator.summary())
+    return report
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "BTCUSDT_data.csv"
+    report = validate_csv(path)
+    report.to_csv(REPORT_FILE, index=False)
+    print(f"Saved data quality report to {REPORT_FILE}")
@@ -5,6 +5,8 @@ import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from data_quality import CandleValidator, REPORT_FILE
+
 # Load API credentials
 load_dotenv()
 BASE_URL = os.getenv("DELTA_BASE_URL", "https://api.delta.exchange")
@@ -34,29 +36,74 @@ def get_ohlcv_data(symbol, resolution='1m', start_time=None, end_time=None):
     df = df.sort_values('time')
     return df
 
-def fetch_all_data(symbol, resolution='1m', months=6):
-    """Fetch full 6 months of 1-min data using paginated requests."""
+def fetch_all_data(symbol, resolution='1m', months=6, refetch_gaps=False):
+    """Fetch full 6 months of 1-min data using paginated requests.
+
+    Every chunk is checked for gaps, duplicates, out of order bars,
+    zero volume runs and price spikes as it arrives; the report is saved
+    to REPORT_FILE. With refetch_gaps, missing ranges are requested again
+    and the report is rebuilt from the merged data.
+    """
     all_data = []
     end = datetime.now()
     start = end - timedelta(days=30*months)
     chunk = timedelta(days=7)  # 1 week at a time
+    validator = CandleValidator()
 
     while start < end:
         next_end = min(start + chunk, end)
         print(f"Fetching: {start.strftime('%Y-%m-%d')} → {next_end.strftime('%Y-%m-%d')}")
 
         df = get_ohlcv_data(symbol, resolution, start, next_end)
-        if df is not None:
+        if df is not None and all_data and df['time'].iloc[0] == all_data[-1]['time'].iloc[-1]:
+            # windows share their boundary bar, keep it from the earlier one;
+            # anything else repeated or earlier is left for the validator
+            df = df.iloc[1:]
+        if df is not None and not df.empty:
+            validator.update(df)
             all_data.append(df)
 
         start = next_end
         time.sleep(1)  # avoid rate limit issues
 
+    report = validator.finish()
+    print("Data quality:", validator.summary())
+
+    refetched = False
+    if refetch_gaps:
+        for gap_start, gap_end in validator.gap_ranges():
+            print(f"Re-fetching gap: {gap_start} → {gap_end}")
+            df = get_ohlcv_data(symbol, resolution, gap_start, gap_end)
+            if df is not None:
+                all_data.append(df)
+                refetched = True
+            time.sleep(1)
+
+    final_df = None
     if all_data:
-        final_df = pd.concat(all_data).drop_duplicates().reset_index(drop=True)
-        return final_df
-    else:
-        return None
+        final_df = (
+            pd.concat(all_data)
+            .drop_duplicates()
+            .sort_values('time')
+            .reset_index(drop=True)
+        )
+
+    if refetched:
+        # check the merged data again so filled gaps drop out of the report;
+        # duplicates and out of order bars describe the download itself and
+        # are kept from the first pass
+        after = CandleValidator()
+        after.update(final_df)
+        report = (
+            pd.concat([report[report['kind'].isin(['duplicate', 'out_of_order'])],
+                       after.finish()])
+            .sort_values(['start', 'kind'])
+            .reset_index(drop=True)
+        )
+        print("After re-fetch:", after.summary())
+    report.to_csv(REPORT_FILE, index=False)
+
+    return final_df
 
 if __name__ == "__main__":
     symbol = "BTCUSDT"  # example symbol, change as needed
@@ -0,0 +1,285 @@
+# model_tuning.py
+import os
+import sys
+import json
+import time
+import importlib
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+from training_dataset import OUTPUT_DIR, dataset_pool, worker_dataset
+
+LEADERBOARD_FILE = "tuner_results/model_leaderboard.csv"
+
+N_ITER = 15            # configurations sampled per model, as in tune_models
+N_SPLITS = 3
+MIN_COMPARE = 3        # results needed on a fold before anything is pruned on it
+PRUNE_QUANTILE = 0.5   # prune configs below this quantile of their model on a fold
+SEED = 42
+
+# the regressors of pipeline_model.ipynb; imported inside the workers
+MODELS = {
+    "DecisionTree": ("sklearn.tree.DecisionTreeRegressor", {"random_state": 42}),
+    "RandomForest": ("sklearn.ensemble.RandomForestRegressor", {"random_state": 42}),
+    "ExtraTrees": ("sklearn.ensemble.ExtraTreesRegressor", {"random_state": 42}),
+    "AdaBoost": ("sklearn.ensemble.AdaBoostRegressor", {"random_state": 42}),
+    "GradientBoosting": ("sklearn.ensemble.GradientBoostingRegressor", {"random_state": 42}),
+    "XGB": ("xgboost.XGBRegressor", {"random_state": 42}),
+    "LGBM": ("lightgbm.LGBMRegressor", {"random_state": 42, "verbose": -1}),
+    "LinearRegression": ("sklearn.linear_model.LinearRegression", {}),
+    "Ridge": ("sklearn.linear_model.Ridge", {}),
+    "Lasso": ("sklearn.linear_model.Lasso", {"max_iter": 5000}),
+}
+
+PARAM_GRIDS = {
+    "DecisionTree": {"max_depth": [5, 10, 15], "min_samples_split": [2, 5, 10], "min_samples_leaf": [1, 3, 5]},
+    "RandomForest": {"n_estimators": [100, 200], "max_depth": [None, 10, 20], "min_samples_split": [2, 5, 10], "min_samples_leaf": [1, 3, 5]},
+    "ExtraTrees": {"n_estimators": [100, 200], "max_depth": [None, 10, 20], "min_samples_split": [2, 5, 10]},
+    "AdaBoost": {"n_estimators": [50, 100, 200], "learning_rate": [0.01, 0.05, 0.1]},
+    "GradientBoosting": {"n_estimators": [100, 200], "learning_rate": [0.01, 0.05, 0.1], "max_depth": [3, 4, 5]},
+    "XGB": {"n_estimators": [100, 200, 300], "learning_rate": [0.01, 0.05, 0.1], "max_depth": [4, 6, 8]},
+    "LGBM": {"n_estimators": [100, 200, 300], "learning_rate": [0.01, 0.05, 0.1], "num_leaves": [31, 50, 70]},
+    "LinearRegression": {"fit_intercept": [True]},
+    "Ridge": {"alpha": [0.01, 0.1, 1.0, 10.0, 100.0]},
+    "Lasso": {"alpha": [1e-5, 1e-4, 1e-3, 1e-2, 1e-1]},
+}
+
+# constructor argument that sets a model's thread count, if it has one
+THREAD_PARAMS = {
+    "RandomForest": "n_jobs",
+    "ExtraTrees": "n_jobs",
+    "XGB": "n_jobs",
+    "LGBM": "n_jobs",
+}
+
+_THREADS = 1
+
+
+def sample_configs(grid: dict, n_iter: int, rng) -> list:
+    """
+    Up to n_iter distinct configurations from a grid, like
+    RandomizedSearchCV with lists only. Small grids are used whole.
+    """
+    names = sorted(grid)
+    sizes = [len(grid[n]) for n in names]
+    total = int(np.prod(sizes))
+    picks = np.arange(total) if total <= n_iter else rng.choice(total, n_iter, replace=False)
+
+    configs = []
+    for flat in picks:
+        idx = np.unravel_index(int(flat), sizes)
+        configs.append({n: grid[n][i] for n, i in zip(names, idx)})
+    return configs
+
+
+def _set_threads(threads: int):
+    global _THREADS
+    _THREADS = threads
+
+
+def _make_model(name: str, params: dict):
+    path, defaults = MODELS[name]
+    module, cls = path.rsplit(".", 1)
+    model_cls = getattr(importlib.import_module(module), cls)
+    kwargs = dict(defaults, **params)
+    if name in THREAD_PARAMS:
+        kwargs[THREAD_PARAMS[name]] = _THREADS
+    return model_cls(**kwargs)
+
+
+def _r2(y_true, y_pred) -> float:
+    ss_res = float(np.sum((y_true - y_pred) ** 2))
+    ss_tot = float(np.sum((y_true - y_true.mean()) ** 2))
+    return 1 - ss_res / ss_tot if ss_tot > 0 else 0.0
+
+
+def _run_job(name: str, params: dict, fold: int, n_splits: int) -> dict:
+    """
+    Fit one configuration on one fold and score it on the fold's
+    validation rows. X[train] is a slice of the memmap, so nothing is
+    copied before the estimator sees it. Only scores travel back.
+    """
+    ds = worker_dataset()
+    train, val = ds.time_series_folds(n_splits)[fold]
+
+    start = time.perf_counter()
+    model = _make_model(name, params)
+    model.fit(ds.X[train], ds.y[train])
+    fit_seconds = time.perf_counter() - start
+
+    y_val = np.asarray(ds.y[val], dtype=np.float64)
+    pred = np.asarray(model.predict(ds.X[val]), dtype=np.float64).reshape(-1)
+    return {
+        "r2": _r2(y_val, pred),
+        "mae": float(np.mean(np.abs(y_val - pred))),
+        "fit_seconds": fit_seconds,
+    }
+
+
+def _available(names) -> list:
+    ok = []
+    for name in names:
+        module = MODELS[name][0].rsplit(".", 1)[0]
+        try:
+            importlib.import_module(module)
+            ok.append(name)
+        except ImportError:
+            print(f"Skipping {name}, {module} is not installed")
+    return ok
+
+
+def _should_prune(fold_scores: list, score: float) -> bool:
+    """
+    Median style pruning: once enough configs of the same model have a
+    score on this fold, drop a config whose running mean is below the
+    PRUNE_QUANTILE of theirs.
+    """
+    if len(fold_scores) < MIN_COMPARE:
+        return False
+    return score < np.quantile(fold_scores, PRUNE_QUANTILE)
+
+
+def run_search(dataset_dir: str = OUTPUT_DIR, models=None, n_iter: int = N_ITER,
+               n_splits: int = N_SPLITS, workers: int = None) -> pd.DataFrame:
+    """
+    Cross validate every (model, config) over time series folds on a
+    process pool, one fold per job. Folds run in order for each config,
+    the cheapest (smallest train set) first, and a config only gets its
+    next fold if its running mean r2 is not in the bottom of what the
+    same model's other configs scored on that fold. Jobs of all models
+    share the pool, so slow models do not serialize the search.
+
+    Results are settled per fold in config order, not completion order:
+    a config is compared only with the configs sampled before it, so the
+    pruned set does not depend on worker timing. A config can therefore
+    wait for a slower predecessor before its next fold is queued.
+    """
+    rng = np.random.default_rng(SEED)
+    names = _available(models or list(MODELS))
+
+    trials = []
+    for name in names:
+        for params in sample_configs(PARAM_GRIDS[name], n_iter, rng):
+            trials.append({"model": name, "params": params, "scores": [], "maes": [],
+                           "means": [], "fit_seconds": 0.0, "status": "RUNNING"})
+
+    # running mean r2 of every config of a model that reached each fold,
+    # and how far down the model's configs each fold has been settled
+    seen = {(name, k): [] for name in names for k in range(n_splits)}
+    settled = {key: 0 for key in seen}
+    order = {name: [i for i, t in enumerate(trials) if t["model"] == name] for name in names}
+
+    pool, workers, _ = dataset_pool(dataset_dir, workers, setup=_set_threads)
+    with pool:
+        running = {
+            pool.submit(_run_job, t["model"], t["params"], 0, n_splits): (i, 0)
+            for i, t in enumerate(trials)
+        }
+        print(f"Tuning {len(names)} models, {len(trials)} configs x {n_splits} folds "
+              f"on {workers} workers")
+
+        def settle():
+            progress = True
+            while progress:
+                progress = False
+                for (name, fold), pos in settled.items():
+                    ids = order[name]
+                    while pos < len(ids):
+                        i = ids[pos]
+                        trial = trials[i]
+                        if len(trial["means"]) <= fold:
+                            if trial["status"] == "RUNNING":
+                                break                   # its result for this fold is still due
+                            pos += 1                    # pruned or failed before this fold
+                            continue
+
+                        mean = trial["means"][fold]
+                        fold_scores = seen[(name, fold)]
+                        prune = _should_prune(fold_scores, mean)
+                        if prune:
+                            print(f"Pruned {name} {trial['params']} at fold {fold}: "
+                                  f"r2 {mean:.4f} < {np.quantile(fold_scores, PRUNE_QUANTILE):.4f} "
+                                  f"over {len(fold_scores)} configs")
+                        fold_scores.append(mean)
+
+                        if fold + 1 == n_splits:
+                            trial["status"] = "COMPLETED"
+                        elif prune:
+                            trial["status"] = "PRUNED"
+                        else:
+                            nxt = pool.submit(_run_job, name, trial["params"], fold + 1, n_splits)
+                            running[nxt] = (i, fold + 1)
+                        pos += 1
+                        progress = True
+                    settled[(name, fold)] = pos
+
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                i, fold = running.pop(fut)
+                trial = trials[i]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    print(f"{trial['model']} {trial['params']} failed:", e)
+                    trial["status"] = "FAILED"
+                    continue
+
+                trial["scores"].append(res["r2"])
+                trial["maes"].append(res["mae"])
+                trial["fit_seconds"] += res["fit_seconds"]
+                trial["means"].append(float(np.mean(trial["scores"])))
+            settle()
+
+    return leaderboard(trials)
+
+
+def leaderboard(trials: list) -> pd.DataFrame:
+    """
+    One row per config, completed configs first, best mean r2 first.
+    """
+    rows = []
+    for t in trials:
+        rows.append({
+            "model": t["model"],
+            "status": t["status"],
+            "mean_r2": float(np.mean(t["scores"])) if t["scores"] else np.nan,
+            "std_r2": float(np.std(t["scores"])) if t["scores"] else np.nan,
+            "mean_mae": float(np.mean(t["maes"])) if t["maes"] else np.nan,
+            "folds": len(t["scores"]),
+            "fit_seconds": round(t["fit_seconds"], 2),
+            "params": json.dumps(t["params"], sort_keys=True),
+        })
+    board = pd.DataFrame(rows)
+    board["completed"] = board["status"] == "COMPLETED"
+    board = board.sort_values(["completed", "mean_r2"], ascending=[False, False])
+    board = board.drop(columns="completed").reset_index(drop=True)
+    board.insert(0, "rank", np.arange(1, len(board) + 1))
+    return board
+
+
+def best_per_model(board: pd.DataFrame) -> pd.DataFrame:
+    """
+    Best completed config of each model, like the results_df of tune_models.
+    """
+    done = board[board["status"] == "COMPLETED"]
+    return done.drop_duplicates("model").reset_index(drop=True)
+
+
+def main():
+    args = sys.argv[1:]
+    dataset_dir = args[0] if len(args) > 0 else OUTPUT_DIR
+    workers = int(args[1]) if len(args) > 1 else None
+    models = args[2].split(",") if len(args) > 2 else None
+
+    board = run_search(dataset_dir, models, workers=workers)
+    os.makedirs(os.path.dirname(LEADERBOARD_FILE) or ".", exist_ok=True)
+    board.to_csv(LEADERBOARD_FILE, index=False)
+    print(f"Saved leaderboard to {LEADERBOARD_FILE} ({len(board)} configs)")
+    print(best_per_model(board))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# nn_tuning.py
+import os
+import sys
+import glob
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from training_dataset import OUTPUT_DIR, dataset_pool, worker_dataset
+
+TUNING_DIR = "tuner_results/parallel_nn_tuning"
+SUMMARY_FILE = "tuner_results/tuning_summary.csv"
+EXISTING_TUNER_DIRS = ["my_tuner_dir/volatility_nn_tuning", "tuner_results/nn_tuning"]
+
+MAX_TRIALS = 27
+MIN_EPOCHS = 5         # budget of the first rung
+MAX_EPOCHS = 45        # budget of the last rung
+ETA = 3                # keep the best 1/ETA of trials at each rung
+PATIENCE = 5
+BATCH_SIZE = 32
+VAL_BATCH_SIZE = 4096  # validation only predicts, larger reads are cheaper
+VAL_FRACTION = 0.2
+SEED = 42
+
+# search space of build_model in pipeline_model.ipynb
+SEARCH_SPACE = {
+    "units_input": ("int", 64, 256, 32),
+    "dropout_input": ("float", 0.1, 0.5, 0.1),
+    "units_hidden1": ("int", 32, 128, 32),
+    "dropout_hidden1": ("float", 0.1, 0.5, 0.1),
+    "units_hidden2": ("int", 32, 128, 32),
+    "learning_rate": ("log", 1e-4, 1e-2, None),
+}
+
+
+def sample_hyperparameters(rng) -> dict:
+    hp = {}
+    for name, (kind, low, high, step) in SEARCH_SPACE.items():
+        if kind == "int":
+            hp[name] = int(rng.choice(np.arange(low, high + 1, step)))
+        elif kind == "float":
+            hp[name] = float(rng.choice(np.round(np.arange(low, high + step / 2, step), 4)))
+        else:
+            hp[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+    return hp
+
+
+def build_model(hp: dict, n_features: int):
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    model = keras.Sequential([
+        layers.Input(shape=(n_features,)),
+        layers.Dense(hp["units_input"], activation="relu"),
+        layers.BatchNormalization(),
+        layers.Dropout(hp["dropout_input"]),
+        layers.Dense(hp["units_hidden1"], activation="relu"),
+        layers.BatchNormalization(),
+        layers.Dropout(hp["dropout_hidden1"]),
+        layers.Dense(hp["units_hidden2"], activation="relu"),
+        layers.Dense(1),
+    ])
+    model.compile(
+        optimizer=keras.optimizers.Adam(hp["learning_rate"]),
+        loss="mse",
+        metrics=["mae"],
+    )
+    return model
+
+
+def _configure_tensorflow(threads: int):
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _split(n: int):
+    val_start = int(n * (1 - VAL_FRACTION))
+    return slice(0, val_start), slice(val_start, n)
+
+
+def _run_trial(trial_id: str, hp: dict, initial_epoch: int, epochs: int) -> dict:
+    """
+    Train one trial up to `epochs`, resuming from its checkpoint when it
+    survived an earlier rung. Returns the best val_mae seen so far.
+
+    The checkpoint is the whole model, so a resumed trial keeps its Adam
+    moments and step count. It is still not bit-identical to one long run:
+    EarlyStopping patience restarts at every rung and the batch order is
+    reseeded (see below).
+    """
+    from tensorflow import keras
+
+    ds = worker_dataset()
+    train, val = _split(len(ds))
+
+    trial_dir = os.path.join(TUNING_DIR, f"trial_{trial_id}")
+    os.makedirs(trial_dir, exist_ok=True)
+    checkpoint_path = os.path.join(trial_dir, "checkpoint.keras")
+
+    if initial_epoch > 0 and os.path.exists(checkpoint_path):
+        # weights and optimizer state, so the learning dynamics carry on
+        model = keras.models.load_model(checkpoint_path)
+    else:
+        model = build_model(hp, ds.X.shape[1])
+
+    # validation is read from the memmap batch by batch, never copied whole
+    # into the worker; the shuffle seed moves on with every rung so a resumed
+    # trial does not replay the batch order of its first epochs
+    history = model.fit(
+        ds.batches(train, BATCH_SIZE, seed=SEED + int(trial_id) * MAX_EPOCHS + initial_epoch),
+        steps_per_epoch=ds.steps(train, BATCH_SIZE),
+        validation_data=ds.batches(val, VAL_BATCH_SIZE, shuffle=False),
+        validation_steps=ds.steps(val, VAL_BATCH_SIZE),
+        initial_epoch=initial_epoch,
+        epochs=epochs,
+        callbacks=[keras.callbacks.EarlyStopping(monitor="val_loss", patience=PATIENCE,
+                                                 restore_best_weights=True)],
+        verbose=0,
+    )
+    model.save(checkpoint_path)
+
+    val_mae = history.history["val_mae"]
+    best_step = int(np.argmin(val_mae))
+    result = {
+        "trial_id": trial_id,
+        "hyperparameters": hp,
+        "val_mae": float(val_mae[best_step]),
+        "val_loss": float(history.history["val_loss"][best_step]),
+        "best_step": initial_epoch + best_step,
+        "epochs_run": initial_epoch + len(val_mae),
+        "stopped_early": len(val_mae) < epochs - initial_epoch,
+    }
+    with open(os.path.join(trial_dir, "trial.json"), "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def _rung_budgets():
+    budgets = [MIN_EPOCHS]
+    while budgets[-1] * ETA <= MAX_EPOCHS:
+        budgets.append(budgets[-1] * ETA)
+    return budgets
+
+
+def run_search(dataset_dir: str = OUTPUT_DIR, workers: int = None,
+               max_trials: int = MAX_TRIALS) -> pd.DataFrame:
+    """
+    Successive halving over random configurations, one trial per worker
+    process. Every rung trains the survivors further, then keeps the
+    best 1/ETA by val_mae.
+    """
+    rng = np.random.default_rng(SEED)
+
+    trials = {f"{i:02d}": sample_hyperparameters(rng) for i in range(max_trials)}
+    alive = list(trials)
+    results = {}
+    trained_to = {tid: 0 for tid in trials}
+
+    pool, workers, _ = dataset_pool(dataset_dir, workers, setup=_configure_tensorflow)
+    with pool:
+        for rung, budget in enumerate(_rung_budgets()):
+            print(f"Rung {rung}: {len(alive)} trials to {budget} epochs on {workers} workers")
+            futures = {
+                tid: pool.submit(_run_trial, tid, trials[tid], trained_to[tid], budget)
+                for tid in alive
+            }
+            for tid, fut in futures.items():
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    print(f"Trial {tid} failed:", e)
+                    res = {"trial_id": tid, "hyperparameters": trials[tid],
+                           "val_mae": float("inf"), "status": "FAILED"}
+                res["rung"] = rung
+                results[tid] = res
+                trained_to[tid] = res.get("epochs_run", budget)
+
+            ranked = sorted(alive, key=lambda t: results[t]["val_mae"])
+            still_running = [t for t in ranked if not results[t].get("stopped_early")]
+            alive = still_running[:max(1, len(ranked) // ETA)]
+            if not alive:
+                break
+
+    rows = []
+    for res in results.values():
+        row = {"source": TUNING_DIR, "trial_id": res["trial_id"],
+               "score": res["val_mae"], "best_step": res.get("best_step"),
+               "rung": res.get("rung"), "status": res.get("status", "COMPLETED")}
+        row.update(res["hyperparameters"])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def load_tuner_trials(directory: str) -> pd.DataFrame:
+    """
+    Flatten keras-tuner trial.json files into one row per trial.
+    """
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "trial_*", "trial.json"))):
+        with open(path, "r") as f:
+            trial = json.load(f)
+        row = {"source": directory, "trial_id": trial.get("trial_id"),
+               "score": trial.get("score"), "best_step": trial.get("best_step"),
+               "rung": None, "status": trial.get("status")}
+        row.update(trial.get("hyperparameters", {}).get("values", {}))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def summarize(new_results: pd.DataFrame = None, output_file: str = SUMMARY_FILE) -> pd.DataFrame:
+    """
+    One table of every tuning run we have, grouped by source and best
+    val_mae first within each. Scores are only ranked within a source:
+    the older keras-tuner runs used a different dataset, scaler, target
+    and split, so their val_mae is not comparable with ours.
+    Filter it with pandas, e.g. summary.query("units_input >= 192").
+    """
+    frames = [load_tuner_trials(d) for d in EXISTING_TUNER_DIRS if os.path.isdir(d)]
+    if new_results is not None:
+        frames.append(new_results)
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    summary = pd.concat(frames, ignore_index=True)
+    summary.insert(1, "rank", summary.groupby("source")["score"].rank(method="min"))
+    summary = summary.sort_values(["source", "score"]).reset_index(drop=True)
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    summary.to_csv(output_file, index=False)
+    print(f"Saved tuning summary to {output_file} ({len(summary)} trials)")
+    return summary
+
+
+def main():
+    args = sys.argv[1:]
+    dataset_dir = args[0] if len(args) > 0 else OUTPUT_DIR
+    workers = int(args[1]) if len(args) > 1 else None
+
+    results = run_search(dataset_dir, workers)
+    summary = summarize(results)
+    print(summary[summary["source"] == TUNING_DIR].head(10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# training_dataset.py
+import os
+import sys
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+INPUT_FILE = "BTC_with_Gold_USD_minute.csv"
+OUTPUT_DIR = "training_dataset"
+
+CHUNK_ROWS = 200_000
+WINDOW = 60            # rolling window used by FeatureEngineering
+WARMUP_ROWS = 128      # > WINDOW + 24 (lag) + 24 (rolling) so chunk edges match a full pass
+TARGET_HORIZON = 12    # target is the 12 bar forward realised volatility
+
+BTC_CLOSE = "close"
+BTC_VOLUME = "volume"
+GOLD_CLOSE = "gold_close_gc=f"
+USD_CLOSE = "usd_close_dx=f"
+
+# Columns left after FeatureEngineering's >0.95 correlation filter on our data.
+# Pinned so every rebuild sees the same feature order. These are the notebook's
+# definitions: paper_trading uses some of the same names for different features
+# (btc_momentum is a price diff there, a 60 bar mean return here).
+FEATURE_COLUMNS = [
+    "btc_return", "gold_return", "usd_return",
+    "btc_momentum", "btc_volatility", "btc_volume_mean",
+    "gold_momentum", "gold_volatility",
+    "usd_momentum", "usd_volatility",
+    "btc_return_lag_1", "btc_return_lag_2", "btc_return_lag_3",
+    "btc_return_lag_6", "btc_return_lag_12",
+    "btc_volatility_lag_12",
+    "btc_return_lag_24", "btc_volatility_lag_24",
+    "btc_return_rolling_mean_3", "btc_return_rolling_std_3",
+    "btc_return_rolling_mean_6", "btc_return_rolling_std_6",
+    "btc_return_rolling_mean_12", "btc_return_rolling_std_12",
+    "btc_return_rolling_mean_24", "btc_return_rolling_std_24",
+    "btc_gold_corr_6h", "btc_usd_corr_6h",
+    "btc_gold_spread", "btc_gold_momentum_diff",
+    "btc_volatility_sqrt", "btc_momentum_sq",
+    "log_btc_volume", "vol_mom_ratio",
+]
+
+# CustomScaler defaults
+WINSORIZE_LIMITS = (0.05, 0.05)
+LOG_FEATURES = ["btc_volume_mean", "btc_volatility", "btc_momentum_sq", "btc_volatility_sqrt"]
+
+
+def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Same feature definitions as FeatureEngineering in pipeline_model.ipynb,
+    computed on a block of raw minute rows. Returns features plus target.
+    """
+    out = pd.DataFrame(index=df.index)
+
+    out["btc_return"] = df[BTC_CLOSE].pct_change()
+    out["gold_return"] = df[GOLD_CLOSE].pct_change()
+    out["usd_return"] = df[USD_CLOSE].pct_change()
+
+    out["btc_momentum"] = out["btc_return"].rolling(WINDOW).mean()
+    out["btc_volatility"] = out["btc_return"].rolling(WINDOW).std()
+    out["btc_volume_mean"] = df[BTC_VOLUME].rolling(WINDOW).mean()
+    out["gold_momentum"] = out["gold_return"].rolling(WINDOW).mean()
+    out["gold_volatility"] = out["gold_return"].rolling(WINDOW).std()
+    out["usd_momentum"] = out["usd_return"].rolling(WINDOW).mean()
+    out["usd_volatility"] = out["usd_return"].rolling(WINDOW).std()
+
+    for lag in [1, 2, 3, 6, 12, 24]:
+        out[f"btc_return_lag_{lag}"] = out["btc_return"].shift(lag)
+    out["btc_volatility_lag_12"] = out["btc_volatility"].shift(12)
+    out["btc_volatility_lag_24"] = out["btc_volatility"].shift(24)
+
+    for w in [3, 6, 12, 24]:
+        out[f"btc_return_rolling_mean_{w}"] = out["btc_return"].rolling(w).mean()
+        out[f"btc_return_rolling_std_{w}"] = out["btc_return"].rolling(w).std()
+
+    out["btc_gold_corr_6h"] = out["btc_return"].rolling(6).corr(out["gold_return"])
+    out["btc_usd_corr_6h"] = out["btc_return"].rolling(6).corr(out["usd_return"])
+    out["btc_gold_spread"] = out["btc_return"] - out["gold_return"]
+    out["btc_gold_momentum_diff"] = out["btc_momentum"] - out["gold_momentum"]
+    out["btc_volatility_sqrt"] = np.sqrt(out["btc_volatility"])
+    out["btc_momentum_sq"] = out["btc_momentum"] ** 2
+    out["log_btc_volume"] = np.log1p(out["btc_volume_mean"])
+    out["vol_mom_ratio"] = out["btc_momentum"] / (out["btc_volatility"] + 1e-6)
+
+    out["target"] = out["btc_return"].rolling(TARGET_HORIZON).std().shift(-TARGET_HORIZON)
+
+    return out.replace([np.inf, -np.inf], np.nan)
+
+
+def _count_rows(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in f) - 1
+
+
+def _engineered_blocks(path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Stream the csv and yield (time, features) blocks, features including target.
+    Each chunk is computed with WARMUP_ROWS of history in front and held
+    back TARGET_HORIZON rows at the end until the next chunk arrives,
+    so every emitted row matches a whole-frame computation.
+    """
+    usecols = ["time", BTC_CLOSE, BTC_VOLUME, GOLD_CLOSE, USD_CLOSE]
+    carry = None
+    emitted_in_carry = 0
+    feats = None
+
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+        buf = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        buf = buf.reset_index(drop=True)
+        buf[[GOLD_CLOSE, USD_CLOSE]] = buf[[GOLD_CLOSE, USD_CLOSE]].ffill()
+
+        feats = engineer_features(buf)
+        stop = max(len(buf) - TARGET_HORIZON, emitted_in_carry)
+        yield buf["time"].iloc[emitted_in_carry:stop], feats.iloc[emitted_in_carry:stop]
+
+        keep = min(len(buf), WARMUP_ROWS + TARGET_HORIZON)
+        carry = buf.iloc[len(buf) - keep:]
+        emitted_in_carry = keep - (len(buf) - stop)
+
+    if feats is not None:
+        yield buf["time"].iloc[stop:], feats.iloc[stop:]
+
+
+def _fit_scaler(raw: np.ndarray) -> dict:
+    """
+    CustomScaler collapses to per column statistics: capping at 2/98 and
+    winsorizing at 5/95 leaves values clipped to the 5/95 quantiles, and
+    RobustScaler then centres on the median and scales by the IQR.
+    Reads one column at a time so only one column is ever in RAM.
+    """
+    lo_q = 100 * WINSORIZE_LIMITS[0]
+    hi_q = 100 * (1 - WINSORIZE_LIMITS[1])
+
+    params = {"lower": [], "upper": [], "center": [], "scale": []}
+    for j in range(raw.shape[1]):
+        col = np.asarray(raw[:, j], dtype=np.float64)
+        lower, q25, median, q75, upper = np.percentile(col, [lo_q, 25, 50, 75, hi_q])
+        iqr = q75 - q25
+        params["lower"].append(float(lower))
+        params["upper"].append(float(upper))
+        params["center"].append(float(median))
+        params["scale"].append(float(iqr) if iqr > 0 else 1.0)
+    return params
+
+
+def transform_block(block: np.ndarray, params: dict, columns=FEATURE_COLUMNS) -> np.ndarray:
+    """
+    Apply fitted scaler parameters to a (rows, features) block.
+    Also usable on a single live feature row.
+    """
+    x = np.clip(block, params["lower"], params["upper"])
+    x = (x - np.asarray(params["center"])) / np.asarray(params["scale"])
+    for name in LOG_FEATURES:
+        if name in columns:
+            j = columns.index(name)
+            x[:, j] = np.log1p(np.clip(x[:, j], 0, None))
+    return x.astype(np.float32)
+
+
+def build_dataset(input_file: str = INPUT_FILE, output_dir: str = OUTPUT_DIR,
+                  chunk_rows: int = CHUNK_ROWS, scale_target: bool = False) -> dict:
+    """
+    Write engineered, scaled float32 features and targets to memory mapped
+    .npy files in `output_dir`, in two streaming passes over the csv.
+
+    y.npy holds the raw target by default, as the NN search in
+    pipeline_model.ipynb trains on. The notebook's tree model cell runs
+    CustomScaler over the frame before taking the target, which clips
+    and robust scales it too; scale_target does the same and stores the
+    target's scaler in meta.json ("target_scaler") to invert predictions.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    n_features = len(FEATURE_COLUMNS)
+    capacity = _count_rows(input_file)
+    print(f"Building dataset from {input_file} ({capacity} rows)")
+
+    # pass 1: unscaled features, column major so the scaler reads columns contiguously
+    raw_path = os.path.join(output_dir, "raw_features.npy")
+    raw = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.float32,
+                                    shape=(capacity, n_features), fortran_order=True)
+    y = np.lib.format.open_memmap(os.path.join(output_dir, "y_tmp.npy"), mode="w+",
+                                  dtype=np.float32, shape=(capacity,))
+    t = np.lib.format.open_memmap(os.path.join(output_dir, "time_tmp.npy"), mode="w+",
+                                  dtype="datetime64[ns]", shape=(capacity,))
+
+    n = 0
+    for times, feats in _engineered_blocks(input_file, chunk_rows):
+        valid = feats[FEATURE_COLUMNS + ["target"]].notna().all(axis=1).values
+        block = feats.loc[valid, FEATURE_COLUMNS].values.astype(np.float32)
+        m = len(block)
+        raw[n:n + m] = block
+        y[n:n + m] = feats.loc[valid, "target"].values.astype(np.float32)
+        t[n:n + m] = pd.to_datetime(times[valid], utc=True).dt.tz_convert(None).values
+        n += m
+    raw.flush()
+    print(f"Rows with full features and target: {n}")
+
+    print("Fitting scaler")
+    params = _fit_scaler(raw[:n])
+    target_params = _fit_scaler(y[:n].reshape(-1, 1)) if scale_target else None
+
+    # pass 2: scaled features, row major for batch reads
+    X = np.lib.format.open_memmap(os.path.join(output_dir, "X.npy"), mode="w+",
+                                  dtype=np.float32, shape=(n, n_features))
+    y_out = np.lib.format.open_memmap(os.path.join(output_dir, "y.npy"), mode="w+",
+                                      dtype=np.float32, shape=(n,))
+    t_out = np.lib.format.open_memmap(os.path.join(output_dir, "time.npy"), mode="w+",
+                                      dtype="datetime64[ns]", shape=(n,))
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        X[start:stop] = transform_block(np.asarray(raw[start:stop], dtype=np.float64), params)
+        if target_params is not None:
+            y_out[start:stop] = transform_block(
+                np.asarray(y[start:stop], dtype=np.float64).reshape(-1, 1),
+                target_params, ["target"])[:, 0]
+        else:
+            y_out[start:stop] = y[start:stop]
+        t_out[start:stop] = t[start:stop]
+    X.flush()
+    y_out.flush()
+    t_out.flush()
+
+    del raw, y, t
+    for name in ["raw_features.npy", "y_tmp.npy", "time_tmp.npy"]:
+        os.remove(os.path.join(output_dir, name))
+
+    meta = {
+        "source": os.path.abspath(input_file),
+        "rows": int(n),
+        "feature_columns": FEATURE_COLUMNS,
+        "scaler": params,
+        "log_features": LOG_FEATURES,
+        "target_horizon": TARGET_HORIZON,
+        "target_scaler": target_params,
+    }
+    with open(os.path.join(output_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"Saved dataset to {output_dir}")
+    return meta
+
+
+class MemmapDataset:
+    """
+    Read only view over a dataset written by build_dataset.
+    Nothing is loaded until a slice is touched.
+    """
+
+    def __init__(self, directory: str = OUTPUT_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.X = np.load(os.path.join(directory, "X.npy"), mmap_mode="r")
+        self.y = np.load(os.path.join(directory, "y.npy"), mmap_mode="r")
+        self.time = np.load(os.path.join(directory, "time.npy"), mmap_mode="r")
+        self.feature_columns = self.meta["feature_columns"]
+
+    def __len__(self):
+        return len(self.y)
+
+    def time_series_folds(self, n_splits: int = 3):
+        """
+        Same boundaries as sklearn TimeSeriesSplit, but as slices.
+        Folds are contiguous so X[train] is a memmap view, not a copy.
+        """
+        n = len(self)
+        test_size = n // (n_splits + 1)
+        folds = []
+        for i in range(n_splits):
+            val_start = n - (n_splits - i) * test_size
+            folds.append((slice(0, val_start), slice(val_start, val_start + test_size)))
+        return folds
+
+    def fold_views(self, n_splits: int = 3):
+        """
+        (X_train, X_val, y_train, y_val) per fold, like get_time_series_splits.
+        """
+        return [
+            (self.X[tr], self.X[va], self.y[tr], self.y[va])
+            for tr, va in self.time_series_folds(n_splits)
+        ]
+
+    def steps(self, rows: slice, batch_size: int = 32) -> int:
+        start, stop, _ = rows.indices(len(self))
+        return max(1, -(-(stop - start) // batch_size))
+
+    def batches(self, rows: slice = slice(None), batch_size: int = 32,
+                shuffle: bool = True, seed: int = 42, loop: bool = True):
+        """
+        Batched (X, y) generator for keras fit / evaluate.
+        Shuffles the order of contiguous batches, not rows, so each batch
+        is a single sequential read from disk. Pass steps() as
+        steps_per_epoch when loop is True.
+        """
+        start, stop, _ = rows.indices(len(self))
+        starts = np.arange(start, stop, batch_size)
+        rng = np.random.default_rng(seed)
+
+        while True:
+            order = rng.permutation(starts) if shuffle else starts
+            for s in order:
+                e = min(s + batch_size, stop)
+                yield np.asarray(self.X[s:e]), np.asarray(self.y[s:e])
+            if not loop:
+                return
+
+
+_WORKER_DATASET = None
+
+
+def _init_pool_worker(dataset_dir: str, threads: int, setup):
+    """
+    Runs once per worker process. Every worker maps the same .npy files,
+    so the OS page cache holds one copy of the data for all of them.
+    """
+    global _WORKER_DATASET
+    _WORKER_DATASET = MemmapDataset(dataset_dir)
+    if setup is not None:
+        setup(threads)
+
+
+def worker_dataset() -> MemmapDataset:
+    """
+    The dataset of the current dataset_pool worker.
+    """
+    return _WORKER_DATASET
+
+
+def dataset_pool(dataset_dir: str = OUTPUT_DIR, workers: int = None, setup=None):
+    """
+    Spawned process pool whose workers share one memmapped dataset, read
+    with worker_dataset(). The cores are split between the workers and
+    setup(threads), a module level function, runs in each worker to cap
+    its library's thread count. Returns (pool, workers, threads).
+    """
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                               initializer=_init_pool_worker,
+                               initargs=(dataset_dir, threads, setup))
+    return pool, workers, threads
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    scale_target = "--scale-target" in args
+    args = [a for a in args if a != "--scale-target"]
+    build_dataset(
+        args[0] if len(args) > 0 else INPUT_FILE,
+        args[1] if len(args) > 1 else OUTPUT_DIR,
+        scale_target=scale_target,
+    )
@@ -0,0 +1,305 @@
+# bar_builder.py
+import math
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from delta_api1 import get_trades
+from tape import TapeExhausted
+from resample import resolution_seconds
+
+HISTORY_BARS = 2000        # closed bars kept per resolution
+
+BAR_DTYPE = np.dtype([
+    ("time", "i8"),        # bar start, epoch seconds (same as get_candles)
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+    ("volume", "f8"),
+    ("trades", "i4"),
+])
+
+OPEN_DTYPE = np.dtype(BAR_DTYPE.descr + [
+    ("bucket", "i8"),      # -1 when the slot is free
+    ("first_ts", "f8"),    # timestamps of the trades that set open / close,
+    ("last_ts", "f8"),     # so out of order trades land on the right side
+])
+
+
+class _Bars:
+    """
+    Bars of one resolution. Open bars live in a handful of slots indexed
+    by bucket number; closed bars go to a fixed size ring buffer.
+    """
+
+    def __init__(self, resolution, history, grace):
+        self.resolution = resolution
+        self.seconds = resolution_seconds(resolution)
+        self.grace = grace
+        self.open = np.zeros(int(math.ceil(grace / self.seconds)) + 2, dtype=OPEN_DTYPE)
+        self.open["bucket"] = -1
+        self.closed = np.zeros(history, dtype=BAR_DTYPE)
+        self.head = 0
+        self.count = 0
+        self.last_closed = None
+        self.late_amended = 0
+        self.late_dropped = 0
+
+    def _push(self, bar, on_bar):
+        self.closed[self.head] = bar
+        self.head = (self.head + 1) % len(self.closed)
+        self.count = min(self.count + 1, len(self.closed))
+        if on_bar is not None:
+            on_bar(self.resolution, bar)
+
+    def _fill_to(self, bucket, on_bar):
+        """
+        Flat zero volume bars at the last close for buckets without trades,
+        up to but excluding `bucket`, capped at the history length.
+        """
+        if self.last_closed is None:
+            return
+        prev_close = self.closed[self.head - 1]["close"]
+        for b in range(max(self.last_closed + 1, bucket - len(self.closed)), bucket):
+            self._push(np.array((b * self.seconds, prev_close, prev_close, prev_close,
+                                 prev_close, 0.0, 0), dtype=BAR_DTYPE), on_bar)
+            self.last_closed = b
+
+    def _emit(self, slot, on_bar):
+        bucket = int(slot["bucket"])
+        self._fill_to(bucket, on_bar)
+        bar = np.zeros((), dtype=BAR_DTYPE)
+        for name in BAR_DTYPE.names:
+            bar[name] = slot[name]
+        self._push(bar, on_bar)
+        self.last_closed = bucket
+        slot["bucket"] = -1
+
+    def _close_through(self, bucket, on_bar):
+        """
+        Close every open bar up to and including `bucket`, oldest first.
+        """
+        live = np.flatnonzero((self.open["bucket"] >= 0) & (self.open["bucket"] <= bucket))
+        for i in live[np.argsort(self.open["bucket"][live])]:
+            self._emit(self.open[i], on_bar)
+
+    def _amend_closed(self, bucket, high, low, volume, n):
+        age = self.last_closed - bucket
+        if age >= self.count:
+            self.late_dropped += n
+            return
+        bar = self.closed[(self.head - 1 - age) % len(self.closed)]
+        bar["high"] = max(bar["high"], high)
+        bar["low"] = min(bar["low"], low)
+        bar["volume"] += volume
+        bar["trades"] += n
+        self.late_amended += n
+
+    def add(self, ts, price, size, on_bar):
+        """
+        Merge time sorted trades. Groups trades by bucket with reduceat, so
+        the python loop runs once per bar touched, not once per trade.
+        """
+        buckets = np.floor(ts / self.seconds).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(ts)] - 1
+        highs = np.maximum.reduceat(price, starts)
+        lows = np.minimum.reduceat(price, starts)
+        volumes = np.add.reduceat(size, starts)
+
+        for k, s in enumerate(starts):
+            bucket = int(buckets[s])
+            e = ends[k]
+            n = int(e - s + 1)
+
+            if self.last_closed is not None and bucket <= self.last_closed:
+                self._amend_closed(bucket, highs[k], lows[k], volumes[k], n)
+                continue
+
+            slot = self.open[bucket % len(self.open)]
+            if slot["bucket"] != bucket:
+                if slot["bucket"] >= 0:
+                    self._close_through(int(slot["bucket"]), on_bar)
+                slot["bucket"] = bucket
+                slot["time"] = bucket * self.seconds
+                slot["open"], slot["first_ts"] = price[s], ts[s]
+                slot["close"], slot["last_ts"] = price[e], ts[e]
+                slot["high"], slot["low"] = highs[k], lows[k]
+                slot["volume"], slot["trades"] = volumes[k], n
+                continue
+
+            if ts[s] < slot["first_ts"]:
+                slot["open"], slot["first_ts"] = price[s], ts[s]
+            if ts[e] >= slot["last_ts"]:
+                slot["close"], slot["last_ts"] = price[e], ts[e]
+            slot["high"] = max(slot["high"], highs[k])
+            slot["low"] = min(slot["low"], lows[k])
+            slot["volume"] += volumes[k]
+            slot["trades"] += n
+
+    def close_until(self, watermark, on_bar):
+        """
+        Close bars whose end plus the grace period is behind the watermark.
+        """
+        last = int(math.floor((watermark - self.grace) / self.seconds)) - 1
+        self._close_through(last, on_bar)
+        # quiet market: keep the series current instead of waiting for a trade
+        self._fill_to(last + 1, on_bar)
+
+    def frame(self, n=None):
+        n = self.count if n is None else min(n, self.count)
+        idx = (self.head - n + np.arange(n)) % len(self.closed)
+        bars = self.closed[idx]
+        return pd.DataFrame({name: bars[name] for name in BAR_DTYPE.names})
+
+
+class BarBuilder:
+    """
+    Aggregates a trade stream into OHLCV bars at several resolutions at
+    once ("1s", "5s", "15s", "1m", ...).
+
+    A bar stays open until the newest trade seen is `grace` seconds past
+    its end, so trades arriving slightly out of order still land in the
+    right bar. Trades older than that amend the stored closed bar (high,
+    low, volume) without emitting it again, or are counted as dropped
+    once the bar has left the history buffer.
+
+    Closed bars are passed to `on_bar(resolution, bar)` as they close and
+    kept in a ring buffer that candles() reads in get_candles format.
+    """
+
+    def __init__(self, resolutions=("1s", "5s", "15s", "1m"), history=HISTORY_BARS,
+                 grace=2.0, on_bar=None):
+        self.books = {r: _Bars(r, history, grace) for r in resolutions}
+        self.on_bar = on_bar
+        self.watermark = -math.inf
+        self._lock = threading.Lock()
+
+    def add_trades(self, ts, price, size):
+        """
+        ts in epoch seconds (float), price and size as arrays of equal length.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        if len(ts) == 0:
+            return
+        price = np.asarray(price, dtype=np.float64)
+        size = np.asarray(size, dtype=np.float64)
+
+        order = np.argsort(ts, kind="stable")
+        ts, price, size = ts[order], price[order], size[order]
+
+        with self._lock:
+            for book in self.books.values():
+                book.add(ts, price, size, self.on_bar)
+            self.watermark = max(self.watermark, ts[-1])
+            for book in self.books.values():
+                book.close_until(self.watermark, self.on_bar)
+
+    def add_trade(self, ts, price, size):
+        self.add_trades([ts], [price], [size])
+
+    def advance(self, now=None):
+        """
+        Move the clock forward without trades, so quiet bars still close.
+        """
+        with self._lock:
+            self.watermark = max(self.watermark, time.time() if now is None else now)
+            for book in self.books.values():
+                book.close_until(self.watermark, self.on_bar)
+
+    def bars(self, resolution, n=None) -> pd.DataFrame:
+        with self._lock:
+            return self.books[resolution].frame(n)
+
+    def candles(self, resolution, window):
+        """
+        Last `window` closed bars as a list of dicts, like get_candles.
+        """
+        return self.bars(resolution, window).to_dict("records")
+
+    def stats(self):
+        return {
+            r: {"bars": b.count, "late_amended": b.late_amended, "late_dropped": b.late_dropped}
+            for r, b in self.books.items()
+        }
+
+
+class TradePoller(threading.Thread):
+    """
+    Polls the public trades endpoint and feeds new trades to a BarBuilder.
+
+    Each poll returns one page of the most recent trades. When the oldest
+    trade on the page is newer than the newest one already seen, the page
+    did not reach back to the last poll and the trades in between are
+    lost; that is logged and counted in `overflows`, as the bars around
+    it are missing volume and may be missing their high or low.
+    """
+
+    def __init__(self, symbol, builder, interval=1.0):
+        super().__init__(daemon=True, name="trade-poller")
+        self.symbol = symbol
+        self.builder = builder
+        self.interval = interval
+        self.overflows = 0
+        self._last_ts = 0
+        self._seen_at_last = set()
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _trade_key(t, ts):
+        # the trade id when the API sends one: identical trades in the
+        # same microsecond are distinct trades
+        trade_id = t.get("id", t.get("trade_id"))
+        if trade_id is not None:
+            return trade_id
+        return (ts, t.get("price"), t.get("size"), t.get("side"))
+
+    def _new_trades(self, trades):
+        oldest = int(trades[0].get("timestamp", 0))
+        if self._last_ts and oldest > self._last_ts:
+            self.overflows += 1
+            print(f"Trade page overflow: nothing between {self._last_ts / 1e6:.3f} and "
+                  f"{oldest / 1e6:.3f} was returned, trades may be missing "
+                  f"({self.overflows} so far, poll faster with TRADE_POLL_SECONDS)")
+
+        fresh = []
+        for t in trades:
+            ts = int(t.get("timestamp", 0))
+            key = self._trade_key(t, ts)
+            if ts < self._last_ts or (ts == self._last_ts and key in self._seen_at_last):
+                continue
+            if ts > self._last_ts:
+                self._last_ts = ts
+                self._seen_at_last = set()
+            self._seen_at_last.add(key)
+            fresh.append(t)
+        return fresh
+
+    def poll_once(self):
+        trades = get_trades(self.symbol)
+        if trades:
+            fresh = self._new_trades(trades)
+            if fresh:
+                self.builder.add_trades(
+                    [int(t["timestamp"]) / 1e6 for t in fresh],
+                    [float(t["price"]) for t in fresh],
+                    [float(t.get("size", 0)) for t in fresh],
+                )
+        self.builder.advance()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except TapeExhausted as e:
+                print("Trade poller stopped, replay finished:", e)
+                return
+            except Exception as e:
+                print("Trade poll error", e)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,139 @@
+# book_features.py
+"""
+Order book snapshot layout and the features built from it. Pure numpy /
+pandas, no config or exchange imports, so research code can read a
+snapshot file without pulling in the live recorder (orderbook.py).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_LEVELS = 10        # levels a snapshot file holds unless the recorder says otherwise
+MAX_STALE_BARS = 1         # a bar's book features need a snapshot at most this many bars old
+
+BOOK_FEATURE_COLUMNS = [
+    "book_spread_bps",         # best ask - best bid, in bps of mid
+    "book_imbalance_1",        # (bid size - ask size) / total at the top level
+    "book_imbalance_n",        # same over all recorded levels
+    "book_depth_bid",          # log1p of the size on the recorded bid levels
+    "book_depth_ask",
+    "book_microprice_bps",     # size weighted mid minus mid, in bps of mid
+    "book_imbalance_mean",     # mean top level imbalance of the snapshots inside the bar
+]
+
+
+def book_dtype(levels: int = DEFAULT_LEVELS) -> np.dtype:
+    return np.dtype([
+        ("time", "f8"),                  # epoch seconds, 0 marks an empty slot
+        ("bid_px", "f8", (levels,)),     # best first, NaN past the last level
+        ("bid_sz", "f4", (levels,)),
+        ("ask_px", "f8", (levels,)),
+        ("ask_sz", "f4", (levels,)),
+    ])
+
+
+def selected_book_columns(spec: str) -> list:
+    """
+    Book features named in BOOK_FEATURES ("all" or a comma list), in
+    canonical order, for appending to FEATURE_COLUMNS.
+    """
+    if not spec:
+        return []
+    if spec.strip() == "all":
+        return list(BOOK_FEATURE_COLUMNS)
+    names = {s.strip() for s in spec.split(",") if s.strip()}
+    unknown = names - set(BOOK_FEATURE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown book features {sorted(unknown)}")
+    return [c for c in BOOK_FEATURE_COLUMNS if c in names]
+
+
+def ordered(ring: np.ndarray) -> np.ndarray:
+    """
+    Filled slots of a ring, oldest first.
+    """
+    filled = ring[ring["time"] > 0]
+    return filled[np.argsort(filled["time"], kind="stable")]
+
+
+def load_snapshots(path: str) -> np.ndarray:
+    if not path or not os.path.exists(path):
+        return np.zeros(0, dtype=book_dtype())
+    return ordered(np.load(path, mmap_mode="r"))
+
+
+def snapshot_features(snaps: np.ndarray) -> pd.DataFrame:
+    """
+    Per snapshot book features, vectorized over the whole array.
+    """
+    bid, ask = snaps["bid_px"][:, 0], snaps["ask_px"][:, 0]
+    bsz, asz = snaps["bid_sz"][:, 0].astype(np.float64), snaps["ask_sz"][:, 0].astype(np.float64)
+    bid_depth = snaps["bid_sz"].sum(axis=1, dtype=np.float64)
+    ask_depth = snaps["ask_sz"].sum(axis=1, dtype=np.float64)
+    mid = (bid + ask) / 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        top = bsz + asz
+        micro = (ask * bsz + bid * asz) / top
+        feats = pd.DataFrame({
+            "time": snaps["time"],
+            "book_spread_bps": (ask - bid) / mid * 1e4,
+            "book_imbalance_1": (bsz - asz) / top,
+            "book_imbalance_n": (bid_depth - ask_depth) / (bid_depth + ask_depth),
+            "book_depth_bid": np.log1p(bid_depth),
+            "book_depth_ask": np.log1p(ask_depth),
+            "book_microprice_bps": (micro - mid) / mid * 1e4,
+        })
+    return feats.replace([np.inf, -np.inf], np.nan)
+
+
+def add_book_features(df: pd.DataFrame, snaps: np.ndarray, bar_seconds: float,
+                      columns=BOOK_FEATURE_COLUMNS) -> pd.DataFrame:
+    """
+    Attach book features to candles on the candle clock. df["time"] is the
+    bar start (naive UTC). Each bar takes the last snapshot before its
+    close, so a bar never sees the book after it ended; bars with no
+    snapshot in the last MAX_STALE_BARS bars get NaN. book_imbalance_mean
+    averages the snapshots inside the bar. Epoch second times are
+    accepted too.
+    """
+    df = df.copy()
+    columns = [c for c in columns if c in BOOK_FEATURE_COLUMNS]
+    if not columns:
+        return df
+    if len(snaps) == 0:
+        for c in columns:
+            df[c] = np.nan
+        return df
+
+    feats = snapshot_features(snaps)
+    t = feats["time"].to_numpy()
+    unit = "s" if pd.api.types.is_numeric_dtype(df["time"]) else None
+    start = pd.to_datetime(df["time"], unit=unit).values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    end = start + bar_seconds
+
+    last = np.searchsorted(t, end, side="left") - 1
+    first = np.searchsorted(t, start, side="left")
+    fresh = (last >= 0) & (t[np.maximum(last, 0)] >= start - MAX_STALE_BARS * bar_seconds)
+    if len(start) and not fresh.any():
+        # expected for a moment after the recorder starts, a bug otherwise
+        print(f"No order book snapshot overlaps bars {pd.Timestamp(start.min(), unit='s')} "
+              f"to {pd.Timestamp(end.max(), unit='s')} (snapshots {pd.Timestamp(t[0], unit='s')} "
+              f"to {pd.Timestamp(t[-1], unit='s')}), book features are NaN")
+
+    for c in columns:
+        if c == "book_imbalance_mean":
+            continue
+        values = feats[c].to_numpy()[np.maximum(last, 0)]
+        df[c] = np.where(fresh, values, np.nan)
+
+    if "book_imbalance_mean" in columns:
+        imb = np.nan_to_num(feats["book_imbalance_1"].to_numpy())
+        csum = np.concatenate([[0.0], np.cumsum(imb)])
+        n = last + 1 - first
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (csum[last + 1] - csum[first]) / n
+        df["book_imbalance_mean"] = np.where(n > 0, mean, np.nan)
+
+    return df
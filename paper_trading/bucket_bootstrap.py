@@ -0,0 +1,180 @@
+# bucket_bootstrap.py
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+INPUT_FILE = "research_data.csv"
+BUCKETS = 10
+RESULT_BOOTSTRAP = "bucket_bootstrap.csv"
+
+N_RESAMPLES = 10_000
+BLOCK_SIZE = 48             # bars per block, keeps intraday autocorrelation inside a block
+CONFIDENCE = 0.95
+MAX_BATCH_ELEMENTS = 4_000_000   # resamples * blocks * prefix columns gathered at once
+SEED = 42
+
+_DATA = {}
+
+
+def _init_worker(bucket, returns, n_buckets, top_bucket, block_size):
+    """
+    Builds prefix sums once per process. Row j of `prefix` is the running
+    total of returns in bucket j, then running counts per bucket, then the
+    running sum of squares of the top bucket strategy. The total over any
+    block is then prefix[end] - prefix[start], whatever its length.
+    """
+    n = len(returns)
+    onehot = np.zeros((n, n_buckets), dtype=np.float64)
+    onehot[np.arange(n), bucket] = 1.0
+    strat = np.where(bucket == top_bucket, returns, 0.0)
+
+    per_row = np.hstack([onehot * returns[:, None], onehot, (strat ** 2)[:, None]])
+    prefix = np.zeros((n + 1, per_row.shape[1]), dtype=np.float64)
+    np.cumsum(per_row, axis=0, out=prefix[1:])
+
+    _DATA.update(
+        prefix=prefix,
+        n=n,
+        n_buckets=n_buckets,
+        top_bucket=top_bucket,
+        block_size=block_size,
+    )
+
+
+def _block_bounds(rng, n_resamples, n, block_size):
+    """
+    Moving block bootstrap as (start, end) row bounds, shape (n_resamples, n_blocks).
+    Each resample is ceil(n / block_size) random blocks laid end to end,
+    the last one cut short so every resample has exactly n rows.
+    """
+    n_blocks = -(-n // block_size)
+    starts = rng.integers(0, n - block_size + 1, size=(n_resamples, n_blocks))
+    lengths = np.full(n_blocks, block_size)
+    lengths[-1] = n - block_size * (n_blocks - 1)
+    return starts, starts + lengths
+
+
+def _resample_batch(n_resamples, seed):
+    """
+    Bucket means and top bucket strategy Sharpe for a batch of resamples,
+    computed from block totals with no python loop over resamples.
+    """
+    prefix = _DATA["prefix"]
+    k = _DATA["n_buckets"]
+    n = _DATA["n"]
+
+    rng = np.random.default_rng(seed)
+    starts, ends = _block_bounds(rng, n_resamples, n, _DATA["block_size"])
+
+    totals = (prefix[ends] - prefix[starts]).sum(axis=1)   # (n_resamples, 2k + 1)
+    sums = totals[:, :k]
+    counts = totals[:, k:2 * k]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+
+    top = _DATA["top_bucket"]
+    strat_mean = sums[:, top] / n
+    strat_var = (totals[:, 2 * k] - n * strat_mean ** 2) / (n - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = strat_mean / np.sqrt(np.clip(strat_var, 0, None))
+
+    return means, sharpe
+
+
+def _batch_sizes(total, n_blocks, width):
+    per_batch = max(1, MAX_BATCH_ELEMENTS // max(n_blocks * width, 1))
+    sizes = [per_batch] * (total // per_batch)
+    if total % per_batch:
+        sizes.append(total % per_batch)
+    return sizes
+
+
+def bootstrap_buckets(bucket, returns, n_resamples=N_RESAMPLES, block_size=BLOCK_SIZE,
+                      confidence=CONFIDENCE, top_bucket=None, workers=None, seed=SEED):
+    """
+    Block bootstrap of per bucket mean returns and of the top bucket long
+    only Sharpe (per bar). Returns (bucket table, sharpe summary dict).
+
+    bucket: integer bucket label per bar (0 .. k-1), in time order
+    returns: forward return per bar, same length
+    """
+    bucket = np.asarray(bucket, dtype=np.int64)
+    returns = np.asarray(returns, dtype=np.float64)
+    n = len(returns)
+    k = int(bucket.max()) + 1
+    block_size = min(block_size, n)
+
+    point = pd.Series(returns).groupby(bucket).mean().reindex(range(k))
+    if top_bucket is None:
+        top_bucket = int(point.idxmax())
+
+    sizes = _batch_sizes(n_resamples, -(-n // block_size), 2 * k + 1)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    init_args = (bucket, returns, k, top_bucket, block_size)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as pool:
+            parts = list(pool.map(_resample_batch, sizes, seeds))
+    else:
+        _init_worker(*init_args)
+        parts = [_resample_batch(s, sd) for s, sd in zip(sizes, seeds)]
+
+    means = np.concatenate([p[0] for p in parts])
+    sharpe = np.concatenate([p[1] for p in parts])
+
+    alpha = (1 - confidence) / 2
+    lo, hi = np.nanquantile(means, [alpha, 1 - alpha], axis=0)
+    best = np.argmax(np.where(np.isnan(means), -np.inf, means), axis=1)
+    p_best = np.bincount(best, minlength=k) / len(best)
+
+    table = pd.DataFrame({
+        "mean_return": point.values,
+        "ci_low": lo,
+        "ci_high": hi,
+        "p_best": p_best,
+    }, index=pd.Index(range(k), name="bucket"))
+
+    strat = np.where(bucket == top_bucket, returns, 0.0)
+    sharpe_summary = {
+        "top_bucket": top_bucket,
+        "sharpe": float(strat.mean() / strat.std(ddof=1)),
+        "sharpe_ci_low": float(np.nanquantile(sharpe, alpha)),
+        "sharpe_ci_high": float(np.nanquantile(sharpe, 1 - alpha)),
+        "n_resamples": len(sharpe),
+        "block_size": block_size,
+    }
+    return table, sharpe_summary
+
+
+def main(input_file: str = INPUT_FILE):
+    df = pd.read_csv(input_file, parse_dates=["time"])
+    df = df.sort_values("time").reset_index(drop=True)
+    df = df.dropna(subset=["model_raw", "future_return"])
+
+    df["bucket"] = pd.qcut(
+        df["model_raw"],
+        q=BUCKETS,
+        labels=False,
+        duplicates="drop",
+    )
+
+    print(f"Bootstrapping {N_RESAMPLES} resamples of {len(df)} rows "
+          f"in blocks of {BLOCK_SIZE} bars")
+    table, sharpe = bootstrap_buckets(df["bucket"].values, df["future_return"].values)
+
+    print(f"\nBucket mean return with {int(CONFIDENCE * 100)}% CI and P(best):")
+    print(table)
+    print(f"\nTop bucket {sharpe['top_bucket']} per bar Sharpe: {sharpe['sharpe']:.4f} "
+          f"[{sharpe['sharpe_ci_low']:.4f}, {sharpe['sharpe_ci_high']:.4f}]")
+
+    table.to_csv(RESULT_BOOTSTRAP)
+    print(f"Saved bootstrap stats to {RESULT_BOOTSTRAP}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE)
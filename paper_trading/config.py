@@ -10,3 +10,53 @@ RESOLUTION = os.getenv("RESOLUTION", "1m")
 
 LOG_FILE = os.getenv("LOG_FILE", "paper_trading_log.csv")
 USER_AGENT = os.getenv("USER_AGENT", "delta-forward-tester/1.0")
+
+# Record / replay of external responses: "off", "record" or "replay"
+TAPE_MODE = os.getenv("TAPE_MODE", "off")
+TAPE_FILE = os.getenv("TAPE_FILE", "session_tape.jsonl.gz")
+TAPE_SPEED = os.getenv("TAPE_SPEED", "realtime")   # "realtime" or "fast" (replay only)
+
+# Shadow models: json registry of candidate models scored every tick but never traded
+SHADOW_REGISTRY = os.getenv("SHADOW_REGISTRY", "")          # e.g. "shadow_models.json"
+SHADOW_BUDGET_MS = float(os.getenv("SHADOW_BUDGET_MS", "50"))
+SHADOW_LOG_FILE = os.getenv("SHADOW_LOG_FILE", "shadow_predictions.csv")
+
+METRICS_FILE = os.getenv("METRICS_FILE", "metrics_snapshot.json")
+POSITION_STATE_FILE = os.getenv("POSITION_STATE_FILE", "position_state.json")
+
+# Candle source for the live features: "exchange" polls get_candles, "local"
+# builds bars from the public trade stream (needed for 1s / 5s / 15s resolutions),
+# "resample" derives RESOLUTION bars from the 1m candles as each one closes.
+# With local bars the loop ticks on every bar close, FETCH_INTERVAL at the latest
+BAR_SOURCE = os.getenv("BAR_SOURCE", "exchange")
+TRADE_POLL_SECONDS = float(os.getenv("TRADE_POLL_SECONDS", "1"))
+BAR_GRACE_SECONDS = float(os.getenv("BAR_GRACE_SECONDS", "2"))
+
+# L2 order book snapshots: top levels kept, poll interval and the ring buffer's
+# memory budget. BOOK_FILE backs the ring with a .npy memmap so it survives
+# restarts and data_generation can read it ("" keeps it in memory only).
+# BOOK_FEATURES appends book features to FEATURE_COLUMNS: "all" or a comma list,
+# only for models trained with them.
+BOOK_LEVELS = int(os.getenv("BOOK_LEVELS", "10"))
+BOOK_POLL_SECONDS = float(os.getenv("BOOK_POLL_SECONDS", "1"))
+BOOK_MEMORY_MB = float(os.getenv("BOOK_MEMORY_MB", "64"))
+BOOK_FILE = os.getenv("BOOK_FILE", "orderbook_snapshots.npy")
+BOOK_FEATURES = os.getenv("BOOK_FEATURES", "")
+
+# Versioned model registry: MODEL_REGISTRY_DIR/<version>/model.pkl, with CURRENT
+# naming the live version. New versions are loaded and warmed in the background,
+# go live between ticks, and are rolled back if they raise or return NaN within
+# MODEL_PROBATION_TICKS ticks.
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models")
+MODEL_WATCH_SECONDS = float(os.getenv("MODEL_WATCH_SECONDS", "30"))
+MODEL_PROBATION_TICKS = int(os.getenv("MODEL_PROBATION_TICKS", "10"))
+
+# A replay never touches the live bot's files: everything it writes goes next to
+# the tape instead (session_tape.replay.paper_trading_log.csv, ...)
+if TAPE_MODE == "replay":
+    _REPLAY_PREFIX = TAPE_FILE.split(".jsonl")[0] + ".replay."
+    LOG_FILE = _REPLAY_PREFIX + os.path.basename(LOG_FILE)
+    METRICS_FILE = _REPLAY_PREFIX + os.path.basename(METRICS_FILE)
+    POSITION_STATE_FILE = _REPLAY_PREFIX + os.path.basename(POSITION_STATE_FILE)
+    SHADOW_LOG_FILE = _REPLAY_PREFIX + os.path.basename(SHADOW_LOG_FILE)
+    BOOK_FILE = _REPLAY_PREFIX + os.path.basename(BOOK_FILE) if BOOK_FILE else ""
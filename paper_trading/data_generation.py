@@ -1,9 +1,18 @@
 # data_generation.py
+import os
+import sys
+import json
 import pickle
+import hashlib
+from datetime import datetime, timedelta
+
 import numpy as np
 import pandas as pd
 import yfinance as yf
 
+from book_features import add_book_features, load_snapshots, selected_book_columns
+from resample import resample_ohlcv
+
 MODEL_PATH = "final_model.pkl"
 
 BTC_SYMBOL = "BTC-USD"
@@ -14,7 +23,20 @@ INTERVAL = "5m"      # candle interval for research
 PERIOD = "60d"       # lookback window on Yahoo
 HORIZON = 3          # bars ahead for future return (3 * 5m = 15m)
 
+# multi horizon / multi interval research (--multi)
+HORIZONS = [1, 3, 6, 12]
+INTERVALS = ["1m", "5m", "15m"]
+INTERVAL_PERIODS = {"1m": "7d", "5m": "60d", "15m": "60d"}   # Yahoo intraday limits
+MULTI_OUTPUT_FILE = "research_data_{interval}.csv"
+
 OUTPUT_FILE = "research_data.csv"
+META_FILE = "research_data.meta.json"
+
+# bars of history re-fetched before the last saved row in incremental mode.
+# btc_volatility_lag_24 is a 24 bar rolling std of returns shifted 24 bars,
+# so 24 + 24 + 1 bars are needed before a new row matches a full rebuild.
+WARMUP_BARS = 49
+YAHOO_INTRADAY_DAYS = 59   # Yahoo serves intraday bars for the last 60 days only
 
 FEATURE_COLUMNS = [
     "btc_return", "gold_return", "usd_return",
@@ -35,14 +57,31 @@ FEATURE_COLUMNS = [
     "log_btc_volume", "vol_mom_ratio",
 ]
 
-
-def fetch_yahoo(symbol: str, interval: str, period: str) -> pd.DataFrame:
-    data = yf.download(
-        symbol,
-        period=period,
-        interval=interval,
-        progress=False,
-    )
+# order book features (BOOK_FEATURES) come from the recorded snapshot file
+# (BOOK_FILE, copied into the stage's run dir by pipeline.py), so rows outside
+# the recording period are dropped when any are selected. Both are read
+# here rather than from config, which is the live bot's (a replay remaps
+# BOOK_FILE there).
+BOOK_FILE = os.getenv("BOOK_FILE", "orderbook_snapshots.npy")
+BOOK_COLUMNS = selected_book_columns(os.getenv("BOOK_FEATURES", ""))
+FEATURE_COLUMNS = FEATURE_COLUMNS + BOOK_COLUMNS
+
+
+def fetch_yahoo(symbol: str, interval: str, period: str, start=None) -> pd.DataFrame:
+    if start is not None:
+        data = yf.download(
+            symbol,
+            start=start,
+            interval=interval,
+            progress=False,
+        )
+    else:
+        data = yf.download(
+            symbol,
+            period=period,
+            interval=interval,
+            progress=False,
+        )
 
     if data.empty:
         raise ValueError(f"No data for {symbol}")
@@ -128,25 +167,74 @@ def build_features(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def main():
-    print("Loading model")
-    with open(MODEL_PATH, "rb") as f:
-        model = pickle.load(f)
+def interval_to_timedelta(interval: str) -> timedelta:
+    if interval.endswith("m"):
+        return timedelta(minutes=int(interval[:-1]))
+    if interval.endswith("h"):
+        return timedelta(hours=int(interval[:-1]))
+    if interval.endswith("d"):
+        return timedelta(days=int(interval[:-1]))
+    raise ValueError(f"Unsupported interval {interval}")
+
+
+def model_hash(path: str = MODEL_PATH) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 
-    print("Fetching Yahoo data")
-    btc_df = fetch_yahoo(BTC_SYMBOL, INTERVAL, PERIOD)
-    gold_df = fetch_yahoo(GOLD_SYMBOL, INTERVAL, PERIOD)
-    usd_df = fetch_yahoo(USD_SYMBOL, INTERVAL, PERIOD)
+def load_meta(path: str = META_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print("Warning could not read research metadata:", e)
+        return {}
 
+
+def save_meta(meta: dict, path: str = META_FILE) -> None:
+    with open(path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def research_features(btc_df, gold_df, usd_df, interval=INTERVAL) -> pd.DataFrame:
+    """
+    Aligned bars with every FEATURE_COLUMNS column, rows with missing
+    features dropped.
+    """
     print("Aligning assets")
     df = align_assets(btc_df, gold_df, usd_df)
 
     print("Building features")
     df = build_features(df)
+    if BOOK_COLUMNS:
+        snaps = load_snapshots(BOOK_FILE)
+        if len(snaps) == 0:
+            raise ValueError(f"BOOK_FEATURES is set but there are no order book snapshots "
+                             f"in {os.path.abspath(BOOK_FILE)}")
+        bar_seconds = interval_to_timedelta(interval).total_seconds()
+        df = add_book_features(df, snaps, bar_seconds, BOOK_COLUMNS)
 
     df = df.dropna(subset=FEATURE_COLUMNS)
     print(f"Rows with full features: {len(df)}")
+    return df
 
+
+def build_research_rows(model, btc_df, gold_df, usd_df, horizons=None,
+                        interval=INTERVAL) -> pd.DataFrame:
+    """
+    Align, build features, predict and attach the forward return.
+    Rows without a future price yet are dropped.
+
+    With `horizons`, a future_return_{h} column is added for every h from
+    the same features and predictions, and rows are kept only where the
+    longest horizon is known so every horizon covers the same sample.
+    """
+    df = research_features(btc_df, gold_df, usd_df, interval)
     X = df[FEATURE_COLUMNS].astype("float32").values
 
     print("Running model on history")
@@ -157,13 +245,145 @@ def main():
     df["future_price"] = df["btc_close"].shift(-HORIZON)
     df["future_return"] = np.log(df["future_price"] / df["btc_close"])
 
-    df = df.dropna(subset=["future_return"])
+    columns = ["time", "btc_close", "model_raw", "future_return"]
+    for h in horizons or []:
+        df[f"future_return_{h}"] = np.log(df["btc_close"].shift(-h) / df["btc_close"])
+        columns.append(f"future_return_{h}")
+
+    longest = f"future_return_{max(horizons)}" if horizons else "future_return"
+    df = df.dropna(subset=["future_return", longest])
+
+    return df[columns].reset_index(drop=True)
+
+
+def _can_refresh(meta: dict, current_hash: str) -> bool:
+    if not os.path.exists(OUTPUT_FILE):
+        print("No existing research data, doing a full rebuild")
+        return False
+    if meta.get("model_hash") != current_hash:
+        print("Model file changed since last run, doing a full rebuild")
+        return False
+    if meta.get("interval") != INTERVAL or meta.get("horizon") != HORIZON:
+        print("Interval or horizon changed since last run, doing a full rebuild")
+        return False
+    if meta.get("book_features", []) != BOOK_COLUMNS:
+        print("Book features changed since last run, doing a full rebuild")
+        return False
+    return True
+
+
+def refresh(model) -> pd.DataFrame:
+    """
+    Fetch only bars after the last saved row (plus warm up), compute
+    features and predictions for those and append them.
+    """
+    existing = pd.read_csv(OUTPUT_FILE, parse_dates=["time"])
+    last_ts = existing["time"].max()
+
+    start = last_ts - WARMUP_BARS * interval_to_timedelta(INTERVAL)
+    earliest = datetime.utcnow() - timedelta(days=YAHOO_INTRADAY_DAYS)
+    if start < earliest:
+        print(f"Warning last row {last_ts} is older than Yahoo's intraday window, "
+              f"the dataset will have a gap before {earliest}")
+        start = earliest
+
+    # gold and usd are closed on weekends, fetch a few extra days so the
+    # forward fill onto btc bars has a value to start from
+    macro_start = start - timedelta(days=4)
+
+    print(f"Fetching Yahoo data from {start}")
+    btc_df = fetch_yahoo(BTC_SYMBOL, INTERVAL, PERIOD, start=start)
+    gold_df = fetch_yahoo(GOLD_SYMBOL, INTERVAL, PERIOD, start=macro_start)
+    usd_df = fetch_yahoo(USD_SYMBOL, INTERVAL, PERIOD, start=macro_start)
+
+    new_rows = build_research_rows(model, btc_df, gold_df, usd_df)
+    new_rows = new_rows[new_rows["time"] > last_ts]
+    print(f"New rows since {last_ts}: {len(new_rows)}")
+
+    out = pd.concat([existing, new_rows], ignore_index=True)
+    return out
+
+
+def main(incremental: bool = False):
+    print("Loading model")
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+
+    current_hash = model_hash()
+    meta = load_meta()
+
+    if incremental and _can_refresh(meta, current_hash):
+        out = refresh(model)
+    else:
+        print("Fetching Yahoo data")
+        btc_df = fetch_yahoo(BTC_SYMBOL, INTERVAL, PERIOD)
+        gold_df = fetch_yahoo(GOLD_SYMBOL, INTERVAL, PERIOD)
+        usd_df = fetch_yahoo(USD_SYMBOL, INTERVAL, PERIOD)
+
+        out = build_research_rows(model, btc_df, gold_df, usd_df)
 
-    out = df[["time", "btc_close", "model_raw", "future_return"]].reset_index(drop=True)
     out.to_csv(OUTPUT_FILE, index=False)
+    save_meta({
+        "model_hash": current_hash,
+        "interval": INTERVAL,
+        "horizon": HORIZON,
+        "book_features": BOOK_COLUMNS,
+        "last_time": str(out["time"].max()),
+        "rows": len(out),
+    })
 
     print(f"Saved research data to {OUTPUT_FILE} with {len(out)} rows")
 
 
+def main_multi(intervals=INTERVALS, horizons=HORIZONS, resample: bool = False):
+    """
+    One feature pass and one predict per interval, with forward returns
+    for every horizon written as extra columns.
+
+    By default every interval is downloaded on its own, 3 assets x
+    len(intervals) Yahoo calls, because Yahoo's lookback differs per
+    interval (INTERVAL_PERIODS) and one shared download would cap every
+    interval at the shortest one.
+
+    With `resample` (--resample), each asset is downloaded once at 1m and
+    the other intervals are derived from it locally, so every interval
+    sees the same bars. Yahoo serves 1m for the last 7 days only, which
+    then bounds every interval.
+    """
+    print("Loading model")
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+
+    base = None
+    if resample:
+        period = INTERVAL_PERIODS.get("1m", PERIOD)
+        print(f"Fetching Yahoo 1m data ({period}) to resample")
+        base = {s: fetch_yahoo(s, "1m", period) for s in (BTC_SYMBOL, GOLD_SYMBOL, USD_SYMBOL)}
+
+    for interval in intervals:
+        if base is not None:
+            btc_df, gold_df, usd_df = (
+                base[s] if interval == "1m" else resample_ohlcv(base[s], interval)
+                for s in (BTC_SYMBOL, GOLD_SYMBOL, USD_SYMBOL)
+            )
+        else:
+            period = INTERVAL_PERIODS.get(interval, PERIOD)
+            print(f"Fetching Yahoo data for {interval} ({period}), --resample downloads once")
+            btc_df = fetch_yahoo(BTC_SYMBOL, interval, period)
+            gold_df = fetch_yahoo(GOLD_SYMBOL, interval, period)
+            usd_df = fetch_yahoo(USD_SYMBOL, interval, period)
+
+        out = build_research_rows(model, btc_df, gold_df, usd_df, horizons=horizons,
+                                  interval=interval)
+
+        path = MULTI_OUTPUT_FILE.format(interval=interval)
+        out.to_csv(path, index=False)
+        print(f"Saved {interval} research data to {path} with {len(out)} rows "
+              f"and horizons {horizons}")
+
+
 if __name__ == "__main__":
-    main()
+    if "--multi" in sys.argv:
+        main_multi(resample="--resample" in sys.argv)
+    else:
+        main(incremental="--incremental" in sys.argv)
@@ -6,6 +6,7 @@ import json
 from urllib.parse import urlencode
 
 from config import API_KEY, API_SECRET, BASE_URL, USER_AGENT
+from tape import TAPE
 
 # Use prod API for market data (candles), testnet BASE_URL for trading
 MARKET_DATA_BASE_URL = "https://api.delta.exchange"
@@ -50,7 +51,10 @@ def get_product_id(symbol):
     endpoint = f"/v2/products/{symbol}"
     url = BASE_URL + endpoint
     try:
-        resp = requests.get(url, headers={"User-Agent": USER_AGENT})
+        resp = TAPE.http(
+            f"product:{symbol}",
+            lambda: requests.get(url, headers={"User-Agent": USER_AGENT}),
+        )
         resp.raise_for_status()
         data = resp.json()
         return data["result"]["id"]
@@ -67,7 +71,10 @@ def get_ticker(symbol):
     endpoint = f"/v2/tickers/{symbol}"
     url = BASE_URL + endpoint
     try:
-        resp = requests.get(url, headers={"User-Agent": USER_AGENT})
+        resp = TAPE.http(
+            f"ticker:{symbol}",
+            lambda: requests.get(url, headers={"User-Agent": USER_AGENT}),
+        )
         resp.raise_for_status()
         return resp.json().get("result", None)
     except Exception as e:
@@ -79,6 +86,56 @@ def get_ticker(symbol):
         return None
 
 
+def get_trades(symbol):
+    """
+    Recent public trades for symbol, oldest first.
+    Each trade has "timestamp" (microseconds), "price", "size" and "side".
+    """
+    endpoint = f"/v2/trades/{symbol}"
+    url = MARKET_DATA_BASE_URL + endpoint
+    try:
+        resp = TAPE.http(
+            f"trades:{symbol}",
+            lambda: requests.get(url, headers={"User-Agent": USER_AGENT}),
+        )
+        resp.raise_for_status()
+        result = resp.json().get("result", [])
+        if isinstance(result, dict):
+            result = result.get("trades", [])
+        return sorted(result, key=lambda t: int(t.get("timestamp", 0)))
+    except Exception as e:
+        print("Error fetching trades:", e)
+        try:
+            print("Response text:", resp.text)
+        except Exception:
+            pass
+        return None
+
+
+def get_orderbook(symbol, depth=10):
+    """
+    L2 order book snapshot for symbol, top `depth` levels per side.
+    Returns the result dict: "buy" and "sell" lists of {"price", "size"}
+    (best first) and "last_updated_at" in microseconds.
+    """
+    endpoint = f"/v2/l2orderbook/{symbol}"
+    url = MARKET_DATA_BASE_URL + endpoint
+    try:
+        resp = TAPE.http(
+            f"orderbook:{symbol}",
+            lambda: requests.get(url, params={"depth": depth}, headers={"User-Agent": USER_AGENT}),
+        )
+        resp.raise_for_status()
+        return resp.json().get("result", {})
+    except Exception as e:
+        print("Error fetching order book:", e)
+        try:
+            print("Response text:", resp.text)
+        except Exception:
+            pass
+        return None
+
+
 def get_candles(symbol, resolution="1h", window=50):
     """
     Fetch last `window` candles for given symbol and resolution.
@@ -108,7 +165,10 @@ def get_candles(symbol, resolution="1h", window=50):
 
     url = MARKET_DATA_BASE_URL + endpoint
     try:
-        resp = requests.get(url, params=params, headers={"User-Agent": USER_AGENT})
+        resp = TAPE.http(
+            f"candles:{symbol}:{resolution}",
+            lambda: requests.get(url, params=params, headers={"User-Agent": USER_AGENT}),
+        )
         resp.raise_for_status()
         data = resp.json()
         candles = data.get("result", [])
@@ -157,7 +217,10 @@ def place_order(product_id, side, size):
 
     try:
         # IMPORTANT: use data=payload (raw JSON string), not json=body_dict
-        resp = requests.post(url, headers=headers, data=payload)
+        resp = TAPE.http(
+            f"order:{product_id}",
+            lambda: requests.post(url, headers=headers, data=payload),
+        )
 
         print("DEBUG status:", resp.status_code, "body:", resp.text)
 
@@ -2,6 +2,8 @@ import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
 
+from tape import TAPE
+
 
 def _resolution_to_interval(resolution: str) -> str:
     if resolution == "1m":
@@ -23,12 +25,15 @@ def _fetch_yahoo(symbol: str, resolution: str, window: int) -> pd.DataFrame:
     intraday_intervals = {"1m", "2m", "5m", "15m", "30m", "60m", "90m"}
 
     if interval in intraday_intervals:
-        data = yf.download(
-            symbol,
-            period="5d",
-            interval=interval,
-            progress=False,
-            auto_adjust=False,
+        data = TAPE.frame(
+            f"yahoo:{symbol}:{interval}",
+            lambda: yf.download(
+                symbol,
+                period="5d",
+                interval=interval,
+                progress=False,
+                auto_adjust=False,
+            ),
         )
     else:
         if resolution.endswith("h"):
@@ -42,13 +47,16 @@ def _fetch_yahoo(symbol: str, resolution: str, window: int) -> pd.DataFrame:
 
         end = datetime.utcnow()
 
-        data = yf.download(
-            symbol,
-            start=start,
-            end=end,
-            interval=interval,
-            progress=False,
-            auto_adjust=False,
+        data = TAPE.frame(
+            f"yahoo:{symbol}:{interval}",
+            lambda: yf.download(
+                symbol,
+                start=start,
+                end=end,
+                interval=interval,
+                progress=False,
+                auto_adjust=False,
+            ),
         )
 
     if data.empty:
@@ -0,0 +1,270 @@
+# feature_importance.py
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from live_features import FEATURE_STEPS
+
+MODEL_PATH = "final_model.pkl"
+MATRIX_FILE = "importance_matrix.npz"   # research features, cached between runs
+RESULT_IMPORTANCE = "feature_importance.csv"
+
+N_REPEATS = 5              # permutations per feature
+BUCKETS = 10               # same deciles as strategy_analysis
+MAX_BATCH_ROWS = 1_000_000 # rows per stacked predict call
+PREDICT_BATCH = 8192       # keras batch size inside a predict call
+LIVE_WINDOW = 200          # rows the live path builds features on
+LIVE_REPEATS = 200
+SEED = 42
+
+_MODEL = None
+_DATA = None
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _matrix_meta(dg, model_path: str) -> dict:
+    """
+    What a cached matrix depends on. The Yahoo downloads have no file to
+    fingerprint, so their settings and the feature code stand in for them;
+    recorded order book snapshots are fingerprinted by mtime and size.
+    """
+    meta = {
+        "model_hash": _file_hash(model_path),
+        "columns": list(dg.FEATURE_COLUMNS),
+        "source": [dg.BTC_SYMBOL, dg.GOLD_SYMBOL, dg.USD_SYMBOL,
+                   dg.INTERVAL, dg.PERIOD, dg.HORIZON],
+        "code_hash": _file_hash(dg.__file__),
+        "book_file": None,
+    }
+    if dg.BOOK_COLUMNS and os.path.exists(dg.BOOK_FILE):
+        st = os.stat(dg.BOOK_FILE)
+        meta["book_file"] = [dg.BOOK_FILE, st.st_mtime_ns, st.st_size]
+    return meta
+
+
+def build_matrix(path: str = MATRIX_FILE, model_path: str = MODEL_PATH) -> dict:
+    """
+    Research feature matrix and forward returns, built the way
+    data_generation builds them and cached to `path`. The cache is
+    rebuilt when the model, the feature list or the data behind it
+    changed (see _matrix_meta).
+    """
+    import data_generation as dg
+
+    meta = _matrix_meta(dg, model_path)
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as f:
+            data = {k: f[k] for k in f.files}
+        cached = json.loads(str(data.pop("meta"))) if "meta" in data else {}
+        if cached == meta:
+            return data
+        changed = sorted(k for k in meta if cached.get(k) != meta[k])
+        print(f"Feature matrix {path} is stale ({', '.join(changed)} changed), rebuilding")
+
+    btc_df = dg.fetch_yahoo(dg.BTC_SYMBOL, dg.INTERVAL, dg.PERIOD)
+    gold_df = dg.fetch_yahoo(dg.GOLD_SYMBOL, dg.INTERVAL, dg.PERIOD)
+    usd_df = dg.fetch_yahoo(dg.USD_SYMBOL, dg.INTERVAL, dg.PERIOD)
+    df = dg.research_features(btc_df, gold_df, usd_df)
+
+    df["future_return"] = np.log(df["btc_close"].shift(-dg.HORIZON) / df["btc_close"])
+    df = df.dropna(subset=["future_return"])
+
+    data = {
+        "X": df[dg.FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+        "future_return": df["future_return"].to_numpy(dtype=np.float64),
+        "columns": np.array(dg.FEATURE_COLUMNS),
+    }
+    np.savez(path, meta=np.array(json.dumps(meta)), **data)
+    print(f"Saved feature matrix to {path} ({len(data['X'])} rows)")
+    return data
+
+
+def _predict(model, X: np.ndarray) -> np.ndarray:
+    if hasattr(model, "layers"):
+        out = model.predict(X, batch_size=PREDICT_BATCH, verbose=0)
+    else:
+        out = model.predict(X)
+    return np.asarray(out, dtype=np.float64).reshape(-1)
+
+
+def _init_worker(model_path: str, matrix_path: str):
+    """
+    Runs once per worker process: load the model and the matrix and
+    score the unmodified matrix, which every job is compared against.
+    """
+    global _MODEL, _DATA
+    with open(model_path, "rb") as f:
+        _MODEL = pickle.load(f)
+    _DATA = build_matrix(matrix_path, model_path)
+
+    X, fr = _DATA["X"], _DATA["future_return"]
+    base = _predict(_MODEL, X)
+    _DATA["base_pred"] = base
+    _DATA["edges"] = np.quantile(base, np.linspace(0, 1, BUCKETS + 1)[1:-1])
+    _DATA["col_mean"] = X.mean(axis=0)
+    _DATA["base_scores"] = _score(base[None, :])[0]
+
+
+def _score(preds: np.ndarray) -> np.ndarray:
+    """
+    Scores of stacked predictions (jobs x rows), one row per job:
+    mse, ic (correlation with the forward return), mean absolute shift
+    from the baseline prediction, top bucket mean return and top minus
+    bottom bucket spread. Buckets use the baseline decile edges, so a
+    feature that moves predictions across buckets shows up here.
+    """
+    fr = _DATA["future_return"]
+    n_jobs, n = preds.shape
+
+    mse = ((preds - fr) ** 2).mean(axis=1)
+    pc = preds - preds.mean(axis=1, keepdims=True)
+    fc = fr - fr.mean()
+    denom = np.sqrt((pc ** 2).sum(axis=1) * (fc ** 2).sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ic = np.where(denom > 0, pc @ fc / denom, 0.0)
+    shift = np.abs(preds - _DATA["base_pred"]).mean(axis=1)
+
+    bucket = np.searchsorted(_DATA["edges"], preds, side="right")
+    flat = (bucket + BUCKETS * np.arange(n_jobs)[:, None]).ravel()
+    sums = np.bincount(flat, weights=np.tile(fr, n_jobs), minlength=n_jobs * BUCKETS)
+    counts = np.bincount(flat, minlength=n_jobs * BUCKETS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = (sums / counts).reshape(n_jobs, BUCKETS)
+    top, bottom = means[:, -1], means[:, 0]
+
+    return np.column_stack([mse, ic, shift, top, top - bottom])
+
+
+SCORE_NAMES = ["mse", "ic", "pred_shift", "top_bucket_return", "bucket_spread"]
+
+
+def _run_jobs(jobs: list) -> list:
+    """
+    jobs: (feature index, mode, seed) with mode "permute" or "ablate".
+    Builds the modified copies of X as one stacked array per batch and
+    scores each batch with a single predict call.
+    """
+    X = _DATA["X"]
+    n, k = X.shape
+    per_batch = max(1, MAX_BATCH_ROWS // n)
+    results = []
+
+    for i in range(0, len(jobs), per_batch):
+        batch = jobs[i:i + per_batch]
+        stacked = np.broadcast_to(X, (len(batch), n, k)).copy()
+        for b, (j, mode, seed) in enumerate(batch):
+            if mode == "permute":
+                stacked[b, :, j] = X[np.random.default_rng(seed).permutation(n), j]
+            else:
+                stacked[b, :, j] = _DATA["col_mean"][j]
+
+        preds = _predict(_MODEL, stacked.reshape(-1, k)).reshape(len(batch), n)
+        scores = _score(preds) - _DATA["base_scores"]
+        results.extend((job, s) for job, s in zip(batch, scores))
+    return results
+
+
+def live_build_costs(window: int = LIVE_WINDOW, repeats: int = LIVE_REPEATS) -> pd.Series:
+    """
+    Median time of every step of the live _build_features on a frame of
+    `window` synthetic bars, in microseconds. A feature that others are
+    built from (btc_return, btc_volatility, ...) only saves its time if
+    those go too.
+    """
+    rng = np.random.default_rng(SEED)
+    base = pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=window, freq="min"),
+        "btc_close": 60000 + np.cumsum(rng.normal(0, 20, window)),
+        "btc_volume": rng.uniform(0, 50, window),
+        "gold_close": 2000 + np.cumsum(rng.normal(0, 1, window)),
+        "usd_close": 100 + np.cumsum(rng.normal(0, 0.05, window)),
+    })
+
+    timings = {name: [] for name in FEATURE_STEPS}
+    for _ in range(repeats):
+        df = base.copy()
+        for name, step in FEATURE_STEPS.items():
+            start = time.perf_counter()
+            df[name] = step(df)
+            timings[name].append(time.perf_counter() - start)
+    return pd.Series({k: float(np.median(v)) * 1e6 for k, v in timings.items()}, name="live_build_us")
+
+
+def run(model_path: str = MODEL_PATH, matrix_path: str = MATRIX_FILE,
+        repeats: int = N_REPEATS, workers: int = None) -> pd.DataFrame:
+    """
+    Permutation importance (`repeats` shuffles per feature) and ablation
+    (feature replaced by its mean) for every feature, as deltas against
+    the unmodified matrix: a rise in mse or a fall in ic or bucket spread
+    means the model needed the feature. Repeats are split across worker
+    processes, each scoring its share in large stacked predict calls.
+    """
+    data = build_matrix(matrix_path, model_path)
+    columns = [str(c) for c in data["columns"]]
+    workers = workers or min(repeats, os.cpu_count() or 1)
+
+    rng = np.random.default_rng(SEED)
+    jobs = [(j, "ablate", 0) for j in range(len(columns))]
+    jobs += [(j, "permute", int(rng.integers(2 ** 31)))
+             for _ in range(repeats) for j in range(len(columns))]
+    shares = [jobs[w::workers] for w in range(workers)]
+
+    print(f"Scoring {len(jobs)} modified copies of {len(data['X'])} rows on {workers} workers")
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(model_path, matrix_path)
+        results = _run_jobs(jobs)
+    else:
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker,
+                                 initargs=(model_path, matrix_path)) as pool:
+            results = [r for part in pool.map(_run_jobs, shares) for r in part]
+    print(f"Scored in {time.perf_counter() - start:.1f}s")
+
+    rows = []
+    for (j, mode, _), scores in results:
+        row = {"feature": columns[j], "mode": mode}
+        row.update(zip(SCORE_NAMES, scores))
+        rows.append(row)
+    raw = pd.DataFrame(rows)
+
+    perm = raw[raw["mode"] == "permute"].groupby("feature")[SCORE_NAMES].agg(["mean", "std"])
+    perm.columns = [f"perm_{name}_{stat}" for name, stat in perm.columns]
+    ablate = raw[raw["mode"] == "ablate"].set_index("feature")[SCORE_NAMES].add_prefix("ablate_")
+
+    report = perm.join(ablate).join(live_build_costs(), how="left")
+    report = report.sort_values("perm_mse_mean", ascending=False)
+    report.index.name = "feature"
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    repeats = int(args[0]) if len(args) > 0 else N_REPEATS
+    workers = int(args[1]) if len(args) > 1 else None
+
+    report = run(repeats=repeats, workers=workers)
+    report.to_csv(RESULT_IMPORTANCE)
+    print(report[["perm_mse_mean", "perm_ic_mean", "perm_pred_shift_mean",
+                  "perm_bucket_spread_mean", "live_build_us"]])
+    print(f"\nSaved feature importance to {RESULT_IMPORTANCE}")
+
+
+if __name__ == "__main__":
+    main()
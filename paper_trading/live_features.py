@@ -0,0 +1,52 @@
+# live_features.py
+import numpy as np
+
+
+def _feature_steps():
+    """
+    One step per feature column, in build order: each takes the frame
+    built so far and returns the new column. Kept as a table so the cost
+    of every feature can be timed on its own (feature_importance.py),
+    and in this module so that needs no model or network imports.
+    """
+    steps = {
+        "btc_return": lambda df: df["btc_close"].pct_change(fill_method=None),
+        "gold_return": lambda df: df["gold_close"].pct_change(fill_method=None),
+        "usd_return": lambda df: df["usd_close"].pct_change(fill_method=None),
+
+        "btc_momentum": lambda df: df["btc_close"].diff(),
+        "gold_momentum": lambda df: df["gold_close"].diff(),
+        "usd_momentum": lambda df: df["usd_close"].diff(),
+
+        "btc_volatility": lambda df: df["btc_return"].rolling(24).std(),
+        "gold_volatility": lambda df: df["gold_return"].rolling(24).std(),
+        "usd_volatility": lambda df: df["usd_return"].rolling(24).std(),
+
+        "btc_volume_mean": lambda df: df["btc_volume"].rolling(24).mean(),
+    }
+
+    for l in [1, 2, 3, 6, 12, 24]:
+        steps[f"btc_return_lag_{l}"] = lambda df, l=l: df["btc_return"].shift(l)
+
+    steps["btc_volatility_lag_12"] = lambda df: df["btc_volatility"].shift(12)
+    steps["btc_volatility_lag_24"] = lambda df: df["btc_volatility"].shift(24)
+
+    for w in [3, 6, 12, 24]:
+        steps[f"btc_return_rolling_mean_{w}"] = lambda df, w=w: df["btc_return"].rolling(w).mean()
+        steps[f"btc_return_rolling_std_{w}"] = lambda df, w=w: df["btc_return"].rolling(w).std()
+
+    steps.update({
+        "btc_gold_corr_6h": lambda df: df["btc_return"].rolling(6).corr(df["gold_return"]),
+        "btc_usd_corr_6h": lambda df: df["btc_return"].rolling(6).corr(df["usd_return"]),
+        "btc_gold_spread": lambda df: df["btc_close"] - df["gold_close"],
+        "btc_gold_momentum_diff": lambda df: df["btc_momentum"] - df["gold_momentum"],
+
+        "btc_volatility_sqrt": lambda df: np.sqrt(df["btc_volatility"].clip(lower=0)),
+        "btc_momentum_sq": lambda df: df["btc_momentum"] ** 2,
+        "log_btc_volume": lambda df: np.log(df["btc_volume"].replace(0, np.nan)),
+        "vol_mom_ratio": lambda df: df["btc_volatility"] / df["btc_momentum"].abs().replace(0, np.nan),
+    })
+    return steps
+
+
+FEATURE_STEPS = _feature_steps()
@@ -0,0 +1,192 @@
+# metrics.py
+import os
+import json
+import math
+from collections import deque
+
+SHARPE_WINDOW = 288        # bars in the rolling Sharpe window (one day of 5m bars)
+SNAPSHOT_EVERY = 60        # bars between automatic snapshots
+
+
+class MetricsAccumulator:
+    """
+    Equity, drawdown, Sharpe, exposure, hit rate and trade count, updated
+    in O(1) per bar. Used by the backtests (one update per research row)
+    and by the live loop (one mark per tick), so both report the same
+    numbers the same way.
+
+    Per bar inputs are the strategy return earned over the bar and the
+    position held during it. A trade is an entry from flat or a flip.
+    """
+
+    def __init__(self, sharpe_window=SHARPE_WINDOW, snapshot_path=None,
+                 snapshot_every=SNAPSHOT_EVERY):
+        self.sharpe_window = sharpe_window
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+
+        self.bars = 0
+        self.equity = 1.0
+        self.peak = 1.0
+        self.max_drawdown = 0.0
+        self.exposed_bars = 0
+        self.active_bars = 0
+        self.wins = 0
+        self.trades = 0
+        self.position = 0
+        self.sum_ret = 0.0
+        self.sum_sq = 0.0
+        self.last_price = None
+
+        self._window = deque()
+        self._win_sum = 0.0
+        self._win_sq = 0.0
+
+    def update(self, ret, position=1):
+        ret = float(ret)
+        position = int(position)
+
+        self.bars += 1
+        self.equity *= 1 + ret
+        if self.equity > self.peak:
+            self.peak = self.equity
+        self.max_drawdown = min(self.max_drawdown, self.drawdown)
+
+        if position != 0:
+            self.exposed_bars += 1
+            if self.position == 0 or (position > 0) != (self.position > 0):
+                self.trades += 1
+        self.position = position
+
+        if ret != 0:
+            self.active_bars += 1
+            if ret > 0:
+                self.wins += 1
+
+        self.sum_ret += ret
+        self.sum_sq += ret * ret
+        self._window.append(ret)
+        self._win_sum += ret
+        self._win_sq += ret * ret
+        if len(self._window) > self.sharpe_window:
+            old = self._window.popleft()
+            self._win_sum -= old
+            self._win_sq -= old * old
+
+        if self.snapshot_path and self.bars % self.snapshot_every == 0:
+            self.snapshot()
+
+    def mark(self, price, position):
+        """
+        Live update from a new price: the bar return is the move since the
+        last mark times the direction of the position held over it.
+        """
+        price = float(price)
+        ret = 0.0
+        if self.last_price and position:
+            ret = math.copysign(1, position) * (price / self.last_price - 1)
+        self.last_price = price
+        self.update(ret, position)
+
+    @property
+    def drawdown(self):
+        return self.equity / self.peak - 1
+
+    @property
+    def total_return(self):
+        return self.equity - 1
+
+    @property
+    def exposure(self):
+        return self.exposed_bars / self.bars if self.bars else 0.0
+
+    @property
+    def hit_rate(self):
+        return self.wins / self.active_bars if self.active_bars else 0.0
+
+    @property
+    def avg_return(self):
+        return self.sum_ret / self.bars if self.bars else 0.0
+
+    @staticmethod
+    def _sharpe(total, total_sq, n):
+        if n < 2:
+            return 0.0
+        mean = total / n
+        var = max((total_sq - n * mean * mean) / (n - 1), 0.0)
+        return mean / math.sqrt(var) if var > 0 else 0.0
+
+    @property
+    def sharpe(self):
+        """Per bar Sharpe over the whole run."""
+        return self._sharpe(self.sum_ret, self.sum_sq, self.bars)
+
+    @property
+    def rolling_sharpe(self):
+        """Per bar Sharpe over the last `sharpe_window` bars."""
+        return self._sharpe(self._win_sum, self._win_sq, len(self._window))
+
+    def summary(self):
+        return {
+            "bars": self.bars,
+            "equity": self.equity,
+            "total_return": self.total_return,
+            "drawdown": self.drawdown,
+            "max_drawdown": self.max_drawdown,
+            "sharpe": self.sharpe,
+            "rolling_sharpe": self.rolling_sharpe,
+            "exposure": self.exposure,
+            "hit_rate": self.hit_rate,
+            "trades": self.trades,
+            "position": self.position,
+        }
+
+    def state(self):
+        state = {k: v for k, v in vars(self).items() if not k.startswith("_")}
+        state["window"] = list(self._window)
+        return state
+
+    def snapshot(self, path=None):
+        path = path or self.snapshot_path
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"summary": self.summary(), "state": self.state()}, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def read_state(path):
+        """
+        State saved in a snapshot file, or None if there is none.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)["state"]
+        except Exception as e:
+            print("Warning could not load metrics snapshot:", e)
+            return None
+
+    @classmethod
+    def restore(cls, path, **kwargs):
+        """
+        Accumulator from a snapshot, or a fresh one if there is none.
+        """
+        return cls.from_state(cls.read_state(path), snapshot_path=path, **kwargs)
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        acc = cls(**kwargs)
+        if not state:
+            return acc
+
+        state = dict(state)
+        window = state.pop("window", [])
+        for k in ("snapshot_path", "snapshot_every", "sharpe_window"):
+            state.pop(k, None)
+        vars(acc).update(state)
+        for r in window[-acc.sharpe_window:]:
+            acc._window.append(r)
+            acc._win_sum += r
+            acc._win_sq += r * r
+        return acc
@@ -1,11 +1,20 @@
-import pickle
 import numpy as np
 import pandas as pd
 import time
+import threading
 
 from delta_api1 import get_candles
 from external_data import get_gold_candles, get_usd_candles
-from config import SYMBOL, RESOLUTION
+from config import (SYMBOL, RESOLUTION, BAR_SOURCE, TRADE_POLL_SECONDS, BAR_GRACE_SECONDS,
+                    BOOK_FEATURES)
+from tape import TAPE
+from shadow_models import ShadowModels
+from bar_builder import BarBuilder, TradePoller
+from resample import Resampler, resolution_seconds
+from model_registry import ModelRegistry, predict_raw
+from orderbook import OrderBookRecorder, BookPoller
+from book_features import add_book_features, selected_book_columns
+from live_features import FEATURE_STEPS
 
 MODEL_PATH = "final_model.pkl"
 
@@ -32,13 +41,16 @@ FEATURE_COLUMNS = [
     "log_btc_volume", "vol_mom_ratio",
 ]
 
-try:
-    with open(MODEL_PATH, "rb") as f:
-        model = pickle.load(f)
-    print("Model loaded")
-except Exception as e:
-    model = None
-    print("Model load failed", e)
+# order book features selected with BOOK_FEATURES, empty by default
+BOOK_COLUMNS = selected_book_columns(BOOK_FEATURES)
+FEATURE_COLUMNS = FEATURE_COLUMNS + BOOK_COLUMNS
+
+# live model, hot swapped from the versioned registry when one exists,
+# otherwise MODEL_PATH loaded once. The watcher starts on the first tick.
+registry = ModelRegistry(MODEL_PATH, len(FEATURE_COLUMNS))
+
+# candidate models scored alongside the primary, never traded
+shadows = ShadowModels()
 
 
 # ===== FIXED THRESHOLDS =====
@@ -48,11 +60,100 @@ except Exception as e:
 BUY_THRESHOLD = 0.00015
 SELL_THRESHOLD = -0.00015
 
+# local bars from the trade stream, started on first use when BAR_SOURCE=local
+_bars = None
+# set whenever a local RESOLUTION bar closes, so the loop ticks on bar close
+_bar_closed = threading.Event()
+# RESOLUTION bars derived from the 1m feed when BAR_SOURCE=resample
+_resampler = None
+
+
+def _resampled_candles(window):
+    """
+    Seed once from the exchange's RESOLUTION candles, then keep them up to
+    date from the last few 1m candles each tick.
+    """
+    global _resampler
+    step = resolution_seconds(RESOLUTION)
+    now = int(time.time())
+
+    if _resampler is None:
+        seed = [c for c in get_candles(SYMBOL, RESOLUTION, window + 1) or []
+                if int(c["time"]) + step <= now]
+        _resampler = Resampler(resolutions=(RESOLUTION,), history=max(window, 2000))
+        _resampler.seed(RESOLUTION, seed)
+
+    if _resampler.last_time is None:
+        # 1m bars of the bucket the seed stopped short of
+        minutes = step // 60 + 2
+    else:
+        minutes = max(2, (now - _resampler.last_time) // 60 + 2)
+
+    _resampler.update_many(get_candles(SYMBOL, "1m", min(minutes, 1500)) or [], now=now)
+    return _resampler.candles(RESOLUTION, window)
+
+
+def _local_bars():
+    global _bars
+    if _bars is None:
+        _bars = BarBuilder(resolutions=(RESOLUTION,), grace=BAR_GRACE_SECONDS,
+                           on_bar=lambda resolution, bar: _bar_closed.set())
+        TradePoller(SYMBOL, _bars, interval=TRADE_POLL_SECONDS).start()
+        print(f"Building {RESOLUTION} bars locally from {SYMBOL} trades")
+    return _bars
+
+
+def _btc_candles(window):
+    if BAR_SOURCE == "resample" and RESOLUTION != "1m":
+        return _resampled_candles(window)
+    if BAR_SOURCE != "local":
+        return get_candles(SYMBOL, RESOLUTION, window)
+    return _local_bars().candles(RESOLUTION, window)
+
+
+def wait_for_tick(timeout):
+    """
+    Pace the trading loop. With local bars the next tick runs as soon as
+    a bar closes (1s / 5s bars drive the loop), waiting at most `timeout`;
+    otherwise this sleeps `timeout` as before.
+    """
+    if BAR_SOURCE != "local":
+        TAPE.sleep(timeout)
+        return
+    _local_bars()
+    _bar_closed.wait(timeout)
+    _bar_closed.clear()
+
+
+# order book recorder, started on first use when book features are selected
+_book = None
+
+
+def _with_book_features(df):
+    global _book
+    if not BOOK_COLUMNS:
+        return df
+
+    if _book is None:
+        _book = OrderBookRecorder()
+        BookPoller(SYMBOL, _book).start()
+        print(f"Recording {SYMBOL} order book for {BOOK_COLUMNS}")
+
+    bar_seconds = resolution_seconds(RESOLUTION)
+    since = df["time"].min().timestamp() - bar_seconds
+    return add_book_features(df, _book.snapshots(since=since), bar_seconds, BOOK_COLUMNS)
+
+
+def _naive_utc(times):
+    # exchange candles carry epoch seconds, the yahoo frames datetimes
+    unit = "s" if pd.api.types.is_numeric_dtype(times) else None
+    return pd.to_datetime(times, unit=unit, utc=True).dt.tz_convert(None)
+
 
 def _align_assets_live(btc_df, gold_df, usd_df):
-    btc_df["time"] = pd.to_datetime(btc_df["time"], utc=True).dt.tz_convert(None)
-    gold_df["time"] = pd.to_datetime(gold_df["time"], utc=True).dt.tz_convert(None)
-    usd_df["time"] = pd.to_datetime(usd_df["time"], utc=True).dt.tz_convert(None)
+    btc_df["time"] = _naive_utc(btc_df["time"])
+    gold_df["time"] = _naive_utc(gold_df["time"])
+    usd_df["time"] = _naive_utc(usd_df["time"])
 
     btc = btc_df.sort_values("time").set_index("time")
     gold = gold_df.sort_values("time").set_index("time")
@@ -76,40 +177,8 @@ def _build_features(df):
         raise ValueError("Not enough data")
 
     df = df.copy()
-
-    df["btc_return"] = df["btc_close"].pct_change(fill_method=None)
-    df["gold_return"] = df["gold_close"].pct_change(fill_method=None)
-    df["usd_return"] = df["usd_close"].pct_change(fill_method=None)
-
-    df["btc_momentum"] = df["btc_close"].diff()
-    df["gold_momentum"] = df["gold_close"].diff()
-    df["usd_momentum"] = df["usd_close"].diff()
-
-    df["btc_volatility"] = df["btc_return"].rolling(24).std()
-    df["gold_volatility"] = df["gold_return"].rolling(24).std()
-    df["usd_volatility"] = df["usd_return"].rolling(24).std()
-
-    df["btc_volume_mean"] = df["btc_volume"].rolling(24).mean()
-
-    for l in [1, 2, 3, 6, 12, 24]:
-        df[f"btc_return_lag_{l}"] = df["btc_return"].shift(l)
-
-    df["btc_volatility_lag_12"] = df["btc_volatility"].shift(12)
-    df["btc_volatility_lag_24"] = df["btc_volatility"].shift(24)
-
-    for w in [3, 6, 12, 24]:
-        df[f"btc_return_rolling_mean_{w}"] = df["btc_return"].rolling(w).mean()
-        df[f"btc_return_rolling_std_{w}"] = df["btc_return"].rolling(w).std()
-
-    df["btc_gold_corr_6h"] = df["btc_return"].rolling(6).corr(df["gold_return"])
-    df["btc_usd_corr_6h"] = df["btc_return"].rolling(6).corr(df["usd_return"])
-    df["btc_gold_spread"] = df["btc_close"] - df["gold_close"]
-    df["btc_gold_momentum_diff"] = df["btc_momentum"] - df["gold_momentum"]
-
-    df["btc_volatility_sqrt"] = np.sqrt(df["btc_volatility"].clip(lower=0))
-    df["btc_momentum_sq"] = df["btc_momentum"] ** 2
-    df["log_btc_volume"] = np.log(df["btc_volume"].replace(0, np.nan))
-    df["vol_mom_ratio"] = df["btc_volatility"] / df["btc_momentum"].abs().replace(0, np.nan)
+    for name, step in FEATURE_STEPS.items():
+        df[name] = step(df)
 
     df = df.replace([np.inf, -np.inf], np.nan).ffill().fillna(0)
 
@@ -118,12 +187,14 @@ def _build_features(df):
 
 
 def predict_signal(window=200, max_retries=3):
-    if model is None:
+    registry.start()
+    registry.swap()
+    if registry.model is None:
         return "hold"
 
     for _ in range(max_retries):
         try:
-            btc_candles = get_candles(SYMBOL, RESOLUTION, window)
+            btc_candles = _btc_candles(window)
             btc_df = pd.DataFrame(btc_candles)
 
             if "volume" not in btc_df.columns:
@@ -133,11 +204,25 @@ def predict_signal(window=200, max_retries=3):
             usd_df = get_usd_candles(RESOLUTION, window)
 
             merged = _align_assets_live(btc_df, gold_df, usd_df)
+            merged = _with_book_features(merged)
             X = _build_features(merged)
 
-            raw_pred = float(model.predict(X, verbose=0)[0][0])
+            start = time.perf_counter()
+            try:
+                raw_pred = float(predict_raw(registry.model, X)[0])
+                if not np.isfinite(raw_pred):
+                    raise ValueError(f"model {registry.version} returned {raw_pred}")
+            except Exception as e:
+                if registry.failed(e):
+                    continue
+                raise
+            primary_ms = (time.perf_counter() - start) * 1000
+            registry.succeeded(X)
             print("raw_pred", raw_pred)
 
+            if shadows:
+                shadows.evaluate(X, raw_pred, primary_ms)
+
             if raw_pred > BUY_THRESHOLD:
                 return "buy"
 
@@ -148,6 +233,6 @@ def predict_signal(window=200, max_retries=3):
 
         except Exception as e:
             print("Signal error", e)
-            time.sleep(2)
+            TAPE.sleep(2)
 
     return "hold"
@@ -0,0 +1,276 @@
+# model_registry.py
+"""
+Versioned model registry with hot swap.
+
+    models/
+        CURRENT                 name of the version that should be live
+        20240501-0930/model.pkl
+        20240501-0930/meta.json
+        20240501-1415/model.pkl
+        20240501-1415/BAD       written when a version failed and was rolled back
+
+    python model_registry.py publish final_model.pkl [version]
+    python model_registry.py list
+    python model_registry.py use <version>
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import threading
+
+import numpy as np
+
+from config import MODEL_REGISTRY_DIR, MODEL_WATCH_SECONDS, MODEL_PROBATION_TICKS
+
+CURRENT_FILE = "CURRENT"
+MODEL_FILE = "model.pkl"
+BAD_FILE = "BAD"
+
+
+def predict_raw(model, X) -> np.ndarray:
+    if hasattr(model, "layers"):
+        out = model.predict(X, verbose=0)
+    else:
+        out = model.predict(X)
+    return np.asarray(out, dtype=np.float64).reshape(-1)
+
+
+def read_current(registry_dir: str = MODEL_REGISTRY_DIR):
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def set_current(version: str, registry_dir: str = MODEL_REGISTRY_DIR) -> None:
+    if not os.path.exists(os.path.join(registry_dir, version, MODEL_FILE)):
+        raise ValueError(f"No model for version {version} in {registry_dir}")
+    tmp = os.path.join(registry_dir, CURRENT_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(registry_dir, CURRENT_FILE))
+
+
+def is_bad(version: str, registry_dir: str = MODEL_REGISTRY_DIR) -> bool:
+    return os.path.exists(os.path.join(registry_dir, version, BAD_FILE))
+
+
+def mark_bad(version: str, reason: str, registry_dir: str = MODEL_REGISTRY_DIR) -> None:
+    path = os.path.join(registry_dir, version, BAD_FILE)
+    if os.path.isdir(os.path.dirname(path)):
+        with open(path, "w") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {reason}\n")
+
+
+def list_versions(registry_dir: str = MODEL_REGISTRY_DIR) -> list:
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        v for v in os.listdir(registry_dir)
+        if os.path.exists(os.path.join(registry_dir, v, MODEL_FILE))
+    )
+
+
+def publish(model_path: str, version: str = None, registry_dir: str = MODEL_REGISTRY_DIR) -> str:
+    """
+    Copy a model file in as a new version and make it current. The
+    version directory appears in one rename, so a watcher never sees a
+    half copied model.
+    """
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(registry_dir, version)
+    if os.path.exists(version_dir):
+        raise ValueError(f"Version {version} already exists")
+
+    tmp = version_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    shutil.copy2(model_path, os.path.join(tmp, MODEL_FILE))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "source": os.path.abspath(model_path),
+            "published_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, f, indent=2)
+    os.rename(tmp, version_dir)
+
+    set_current(version, registry_dir)
+    return version
+
+
+def _load(path: str):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class ModelRegistry:
+    """
+    The live model plus a watcher thread that picks up new versions.
+
+    The watcher loads the version named in CURRENT and warms it with a
+    predict on the last real feature row (zeros before the first tick),
+    off the trading thread. The swap itself happens in swap(), which the
+    loop calls between ticks, so a tick always uses one model from start
+    to end. For MODEL_PROBATION_TICKS ticks after a swap the last model
+    that passed probation is kept, and failed() switches back to it if
+    the new one raises or returns NaN.
+
+    Without a registry directory the fallback file is loaded once, as
+    before.
+    """
+
+    def __init__(self, fallback_path, n_features, registry_dir=MODEL_REGISTRY_DIR,
+                 watch_seconds=MODEL_WATCH_SECONDS, probation_ticks=MODEL_PROBATION_TICKS):
+        self.registry_dir = registry_dir
+        self.n_features = n_features
+        self.watch_seconds = watch_seconds
+        self.probation_ticks = probation_ticks
+
+        self.model = None
+        self.version = None
+        self.last_X = None
+        self._pending = None        # (version, model) loaded and warmed, not live yet
+        self._previous = None       # (version, model) last known good, set during probation
+        self._probation = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        current = read_current(registry_dir)
+        if current and not is_bad(current, registry_dir):
+            try:
+                self.model = _load(os.path.join(registry_dir, current, MODEL_FILE))
+                self.version = current
+            except Exception as e:
+                print(f"Model version {current} load failed", e)
+
+        if self.model is None:
+            try:
+                self.model = _load(fallback_path)
+                self.version = f"file:{fallback_path}"
+            except Exception as e:
+                print("Model load failed", e)
+
+        if self.model is not None:
+            print(f"Model loaded ({self.version})")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, daemon=True, name="model-watcher")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _watch(self):
+        while not self._stop_event.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                print("Model watcher error", e)
+            self._stop_event.wait(self.watch_seconds)
+
+    def _warm_up(self, model):
+        X = self.last_X
+        if X is None:
+            X = np.zeros((1, self.n_features), dtype=np.float32)
+        pred = predict_raw(model, X)
+        if pred.size == 0 or not np.all(np.isfinite(pred)):
+            raise ValueError(f"warm up predict returned {pred}")
+
+    def check(self):
+        """
+        Load and warm the CURRENT version if it is new. Runs on the
+        watcher thread; the result waits in _pending for swap().
+        """
+        current = read_current(self.registry_dir)
+        if current is None or is_bad(current, self.registry_dir):
+            return
+        with self._lock:
+            known = {self.version, self._pending[0] if self._pending else None}
+        if current in known:
+            return
+
+        print(f"Loading model version {current}")
+        start = time.perf_counter()
+        try:
+            model = _load(os.path.join(self.registry_dir, current, MODEL_FILE))
+            self._warm_up(model)
+        except Exception as e:
+            print(f"Model version {current} rejected", e)
+            mark_bad(current, f"load or warm up failed: {e}", self.registry_dir)
+            return
+
+        with self._lock:
+            self._pending = (current, model)
+        print(f"Model version {current} ready in {time.perf_counter() - start:.1f}s")
+
+    def swap(self):
+        """
+        Make a pending version live. Call between ticks.
+        """
+        with self._lock:
+            if self._pending is None:
+                return
+            version, model = self._pending
+            self._pending = None
+        # a version swapped in during another's probation replaces the
+        # unproven one; the rollback target stays the last known good
+        if self._previous is None:
+            self._previous = (self.version, self.model)
+        self.version, self.model = version, model
+        self._probation = self.probation_ticks
+        print(f"Swapped model to {version} (rollback to {self._previous[0]})")
+
+    def succeeded(self, X=None):
+        if X is not None:
+            self.last_X = X
+        if self._probation > 0:
+            self._probation -= 1
+            if self._probation == 0:
+                self._previous = None
+
+    def failed(self, reason) -> bool:
+        """
+        Roll back to the previous model if the live one is on probation.
+        Returns True when a rollback happened, so the tick can retry.
+        """
+        if self._previous is None or self._previous[1] is None:
+            return False
+
+        bad_version = self.version
+        self.version, self.model = self._previous
+        self._previous = None
+        self._probation = 0
+        print(f"Rolled back model {bad_version} to {self.version}: {reason}")
+
+        mark_bad(bad_version, str(reason), self.registry_dir)
+        if self.version in list_versions(self.registry_dir):
+            set_current(self.version, self.registry_dir)
+        return True
+
+
+def main():
+    args = sys.argv[1:]
+    command = args[0] if args else "list"
+
+    if command == "publish":
+        version = publish(args[1], args[2] if len(args) > 2 else None)
+        print(f"Published {args[1]} as {version}")
+    elif command == "use":
+        set_current(args[1])
+        print(f"Current model set to {args[1]}")
+    else:
+        current = read_current()
+        for v in list_versions():
+            flags = (" *" if v == current else "") + (" BAD" if is_bad(v) else "")
+            print(f"{v}{flags}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# orderbook.py
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+
+from config import SYMBOL, BOOK_LEVELS, BOOK_POLL_SECONDS, BOOK_MEMORY_MB, BOOK_FILE
+from delta_api1 import get_orderbook
+from tape import TapeExhausted
+from book_features import book_dtype
+
+FLUSH_EVERY = 60           # snapshots between flushes of a file backed ring
+
+
+def _open_ring(path, dtype, capacity):
+    """
+    Ring storage: a .npy memmap when a path is given, so snapshots survive
+    restarts and research can read them, otherwise plain memory.
+    """
+    if not path:
+        return np.zeros(capacity, dtype=dtype)
+    if os.path.exists(path):
+        try:
+            ring = np.lib.format.open_memmap(path, mode="r+")
+            if ring.dtype == dtype and ring.shape == (capacity,):
+                return ring
+            print(f"Order book file {path} has a different layout, starting a new one")
+            del ring
+        except Exception as e:
+            print(f"Order book file {path} could not be opened, starting a new one", e)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(capacity,))
+
+
+class OrderBookRecorder:
+    """
+    Top-N L2 snapshots in a fixed size structured ring buffer. The size is
+    set by a memory budget, not a count, so with 10 levels 64 MB holds
+    about three days of one second snapshots and never grows past that.
+    """
+
+    def __init__(self, levels=BOOK_LEVELS, memory_mb=BOOK_MEMORY_MB, path=BOOK_FILE):
+        self.levels = levels
+        self.dtype = book_dtype(levels)
+        self.capacity = max(1, int(memory_mb * 2 ** 20) // self.dtype.itemsize)
+        self.ring = _open_ring(path, self.dtype, self.capacity)
+        self._lock = threading.Lock()
+        self._since_flush = 0
+
+        times = self.ring["time"]
+        self.count = int(np.count_nonzero(times > 0))
+        self.head = int(np.argmax(times) + 1) % self.capacity if self.count else 0
+        if self.count:
+            print(f"Order book ring resumed with {self.count} snapshots")
+
+    def add(self, ts, bids, asks):
+        """
+        bids / asks as (price, size) pairs, best first. Levels beyond the
+        ones given are stored as NaN price and zero size.
+        """
+        row = np.zeros((), dtype=self.dtype)
+        row["time"] = ts
+        for side, levels in (("bid", bids), ("ask", asks)):
+            px = np.full(self.levels, np.nan)
+            sz = np.zeros(self.levels, dtype=np.float32)
+            levels = levels[:self.levels]
+            if len(levels):
+                arr = np.asarray(levels, dtype=np.float64)
+                px[:len(arr)] = arr[:, 0]
+                sz[:len(arr)] = arr[:, 1]
+            row[f"{side}_px"] = px
+            row[f"{side}_sz"] = sz
+
+        with self._lock:
+            self.ring[self.head] = row
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self._since_flush += 1
+            if isinstance(self.ring, np.memmap) and self._since_flush >= FLUSH_EVERY:
+                self.ring.flush()
+                self._since_flush = 0
+
+    def add_orderbook(self, book: dict):
+        """
+        Store a get_orderbook result.
+        """
+        ts = book.get("last_updated_at")
+        ts = int(ts) / 1e6 if ts else time.time()
+        bids = [(float(l["price"]), float(l["size"])) for l in book.get("buy", [])]
+        asks = [(float(l["price"]), float(l["size"])) for l in book.get("sell", [])]
+        self.add(ts, bids, asks)
+
+    def snapshots(self, since=None) -> np.ndarray:
+        """
+        Copy of the stored snapshots, oldest first, optionally only those
+        at or after `since` (epoch seconds).
+        """
+        with self._lock:
+            n = self.count
+            idx = (self.head - n + np.arange(n)) % self.capacity
+            if since is not None:
+                # times are sorted along idx: copy only the rows asked for
+                idx = idx[np.searchsorted(self.ring["time"][idx], since, side="left"):]
+            return self.ring[idx]
+
+
+class BookPoller(threading.Thread):
+    """
+    Polls the L2 order book endpoint into an OrderBookRecorder.
+    """
+
+    def __init__(self, symbol, recorder, interval=BOOK_POLL_SECONDS):
+        super().__init__(daemon=True, name="book-poller")
+        self.symbol = symbol
+        self.recorder = recorder
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def poll_once(self):
+        book = get_orderbook(self.symbol, self.recorder.levels)
+        if book:
+            self.recorder.add_orderbook(book)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except TapeExhausted as e:
+                print("Order book poller stopped, replay finished:", e)
+                return
+            except Exception as e:
+                print("Order book poll error", e)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+if __name__ == "__main__":
+    # standalone recorder, e.g. to collect snapshots for research
+    symbol = sys.argv[1] if len(sys.argv) > 1 else SYMBOL
+    recorder = OrderBookRecorder()
+    print(f"Recording {symbol} top {recorder.levels} levels to {BOOK_FILE or 'memory'}, "
+          f"capacity {recorder.capacity} snapshots")
+    poller = BookPoller(symbol, recorder)
+    poller.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"{recorder.count} snapshots stored")
+    except KeyboardInterrupt:
+        poller.stop()
+        if isinstance(recorder.ring, np.memmap):
+            recorder.ring.flush()
@@ -1,14 +1,14 @@
-import time
 import csv
 from datetime import datetime
 import os
 import json
 
 from delta_api1 import get_ticker, place_order, get_product_id
-from config import SYMBOL, TRADE_SIZE, FETCH_INTERVAL, LOG_FILE
-from model_inference import predict_signal
-
-POSITION_STATE_FILE = "position_state.json"
+from config import (SYMBOL, TRADE_SIZE, FETCH_INTERVAL, LOG_FILE, METRICS_FILE,
+                    POSITION_STATE_FILE, SHADOW_LOG_FILE, BOOK_FILE)
+from model_inference import predict_signal, wait_for_tick
+from tape import TAPE, TapeExhausted
+from metrics import MetricsAccumulator
 
 
 def load_position_state(path: str = POSITION_STATE_FILE) -> int:
@@ -64,6 +64,13 @@ def log_trade(timestamp, price, signal, order_response, position_after):
 def main():
     print("✅ Starting Paper Trading on Delta Exchange Testnet...")
 
+    if TAPE.mode == "replay":
+        # config points these at replay files next to the tape; start them
+        # empty so every replay of the same tape writes the same output
+        for path in (LOG_FILE, METRICS_FILE, POSITION_STATE_FILE, SHADOW_LOG_FILE, BOOK_FILE):
+            if path and os.path.exists(path):
+                os.remove(path)
+
     # create log file header if it does not exist
     if not os.path.exists(LOG_FILE):
         with open(LOG_FILE, "w", newline="") as f:
@@ -84,16 +91,24 @@ def main():
         print("Error: product_id not found. Check symbol and API connectivity.")
         return
 
-    # load position from disk so restart is safe
-    current_position = load_position_state()
+    # load position and running P&L / risk from disk so restart is safe.
+    # Both are recorded on the tape, so a replay starts where the recorded
+    # session did (flat for tapes recorded without them).
+    start_state = TAPE.value("session_start", lambda: {
+        "position": load_position_state(),
+        "metrics": MetricsAccumulator.read_state(METRICS_FILE),
+    }, default={"position": 0, "metrics": None})
+    current_position = int(start_state["position"])
     print(f"Loaded position from disk: {current_position} contracts")
 
+    metrics = MetricsAccumulator.from_state(start_state["metrics"], snapshot_path=METRICS_FILE)
+
     while True:
         try:
             ticker = get_ticker(SYMBOL)
             if not ticker:
                 print("Warning: No ticker returned, retrying...")
-                time.sleep(FETCH_INTERVAL)
+                TAPE.sleep(FETCH_INTERVAL)
                 continue
 
             price = float(
@@ -103,12 +118,18 @@ def main():
             )
             if price <= 0:
                 print("Warning: Invalid price, retrying...")
-                time.sleep(FETCH_INTERVAL)
+                TAPE.sleep(FETCH_INTERVAL)
                 continue
 
+            # mark the position held since the last tick before acting on a new signal
+            metrics.mark(price, current_position)
+
             signal = predict_signal()
             now = datetime.now()
-            print(f"[{now}] Price: {price} | Signal: {signal} | Position: {current_position}")
+            print(
+                f"[{now}] Price: {price} | Signal: {signal} | Position: {current_position}"
+                f" | Equity: {metrics.equity:.4f} | DD: {metrics.drawdown:.4f}"
+            )
 
             # decide whether we actually want to trade
             order_side = None
@@ -154,11 +175,16 @@ def main():
                 order_response = {"status": "hold"}
 
             log_trade(now, price, signal, order_response, current_position)
-            time.sleep(FETCH_INTERVAL)
+            wait_for_tick(FETCH_INTERVAL)
+
+        except TapeExhausted as e:
+            print("Replay finished:", e)
+            metrics.snapshot()
+            break
 
         except Exception as e:
             print("Error in loop:", e)
-            time.sleep(10)
+            TAPE.sleep(10)
 
 
 if __name__ == "__main__":
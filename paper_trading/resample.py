@@ -0,0 +1,235 @@
+# resample.py
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ["5m", "15m", "1h", "1d"]
+BASE_RESOLUTION = "1m"
+HISTORY_BARS = 2000        # closed bars kept per resolution by Resampler
+CHUNK_ROWS = 1_000_000
+
+
+def resolution_seconds(resolution: str) -> int:
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if resolution[-1] not in units:
+        raise ValueError(f"Unsupported resolution {resolution}")
+    return int(resolution[:-1]) * units[resolution[-1]]
+
+
+def _agg_kind(column: str) -> str:
+    """
+    How a column combines over a bar, from its name: open / high / low /
+    close / volume (also prefixed, e.g. gold_close), anything else last.
+    """
+    name = column.lower()
+    for suffix, kind in (("open", "first"), ("high", "max"), ("low", "min"), ("volume", "sum")):
+        if name == suffix or name.endswith("_" + suffix):
+            return kind
+    return "last"
+
+
+def _epoch_seconds(times) -> np.ndarray:
+    times = pd.Series(times)
+    if pd.api.types.is_numeric_dtype(times):
+        return times.to_numpy(dtype=np.int64)
+    t = pd.to_datetime(times, utc=True)
+    return t.values.astype("datetime64[s]").astype(np.int64)
+
+
+def resample_ohlcv(df: pd.DataFrame, resolution: str, base: str = BASE_RESOLUTION,
+                   include_partial: bool = False) -> pd.DataFrame:
+    """
+    Time sorted base bars to `resolution` bars in one pass: bars are cut
+    into segments by bucket and every column is reduced per segment with
+    ufunc.reduceat. Buckets are aligned to epoch multiples (UTC midnight
+    for 1d), as the exchange does.
+
+    The last bucket is dropped while still forming (its base bars do not
+    reach its end) unless include_partial. Buckets with missing base bars
+    inside them are kept, like an exchange bar after a quiet period.
+    The output "time" keeps the input's type (epoch seconds or datetimes).
+    """
+    if df.empty:
+        return df.copy()
+
+    step = resolution_seconds(resolution)
+    base_step = resolution_seconds(base)
+    t = _epoch_seconds(df["time"])
+    buckets = t // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+
+    out = {}
+    bucket_start = buckets[starts] * step
+    if pd.api.types.is_numeric_dtype(df["time"]):
+        out["time"] = bucket_start
+    else:
+        stamps = pd.to_datetime(bucket_start, unit="s", utc=True)
+        aware = pd.to_datetime(df["time"].iloc[:1]).dt.tz is not None
+        out["time"] = stamps if aware else stamps.tz_localize(None)
+
+    for col in df.columns:
+        if col == "time" or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col].to_numpy(dtype=np.float64)
+        kind = _agg_kind(col)
+        if kind == "first":
+            out[col] = values[starts]
+        elif kind == "last":
+            out[col] = values[ends]
+        elif kind == "max":
+            out[col] = np.fmax.reduceat(values, starts)
+        elif kind == "min":
+            out[col] = np.fmin.reduceat(values, starts)
+        else:
+            out[col] = np.add.reduceat(np.nan_to_num(values), starts)
+
+    bars = pd.DataFrame(out)
+    if not include_partial and t[-1] + base_step < bucket_start[-1] + step:
+        bars = bars.iloc[:-1]
+    return bars.reset_index(drop=True)
+
+
+def resample_csv(path: str, resolutions=RESOLUTIONS, output_pattern: str = None,
+                 chunk_rows: int = CHUNK_ROWS) -> dict:
+    """
+    Derive every resolution from a stored 1m csv in chunks. Rows of the
+    coarsest bucket still open at the end of a chunk are carried into the
+    next one, so chunk edges never split a bar. Resolutions must divide
+    the coarsest one, as 5m / 15m / 1h / 1d do.
+    """
+    stem = path.rsplit(".", 1)[0]
+    output_pattern = output_pattern or stem + "_{resolution}.csv"
+    coarsest = max(resolution_seconds(r) for r in resolutions)
+
+    carry = None
+    written = {r: 0 for r in resolutions}
+    reader = pd.read_csv(path, chunksize=chunk_rows)
+    chunk = next(reader, None)
+    while chunk is not None:
+        nxt = next(reader, None)
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        if nxt is not None:
+            t = _epoch_seconds(chunk["time"])
+            cut = np.searchsorted(t, (t[-1] // coarsest) * coarsest, side="left")
+            carry, chunk = chunk.iloc[cut:], chunk.iloc[:cut]
+
+        for r in resolutions:
+            # inner chunks end on a bucket edge, only the last one can end mid bar
+            bars = resample_ohlcv(chunk, r, include_partial=nxt is not None) if len(chunk) else chunk
+            out_path = output_pattern.format(resolution=r)
+            bars.to_csv(out_path, mode="w" if written[r] == 0 else "a",
+                        header=written[r] == 0, index=False)
+            written[r] += len(bars)
+        chunk = nxt
+
+    for r in resolutions:
+        print(f"Saved {written[r]} {r} bars to {output_pattern.format(resolution=r)}")
+    return written
+
+
+class Resampler:
+    """
+    Higher timeframe bars kept up to date from closed 1m bars. Each
+    update touches only the open bar of every resolution: O(1) per 1m
+    bar, no re-fetch and no re-resample of history.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS, history=HISTORY_BARS, base=BASE_RESOLUTION):
+        self.base_step = resolution_seconds(base)
+        self.steps = {r: resolution_seconds(r) for r in resolutions}
+        self.closed = {r: deque(maxlen=history) for r in resolutions}
+        self.open = {r: None for r in resolutions}
+        self._closed_until = {r: -1 for r in resolutions}
+        self.last_time = None
+
+    def seed(self, resolution: str, candles) -> None:
+        """
+        Start a resolution from closed bars in get_candles format (e.g. one
+        get_candles call without its forming bar). 1m bars inside them are
+        ignored afterwards.
+        """
+        bars = sorted((dict(c, time=int(c["time"])) for c in candles), key=lambda b: b["time"])
+        if bars:
+            self.closed[resolution].extend(bars)
+            self._closed_until[resolution] = bars[-1]["time"] + self.steps[resolution]
+
+    def _close(self, resolution, closed):
+        bar = self.open[resolution]
+        self.closed[resolution].append(bar)
+        self._closed_until[resolution] = bar["time"] + self.steps[resolution]
+        self.open[resolution] = None
+        closed.append((resolution, bar))
+
+    def update(self, bar: dict) -> list:
+        """
+        Feed one closed 1m bar. Returns the (resolution, bar) pairs it
+        closed. Bars at or before the last one fed are ignored.
+        """
+        t = int(bar["time"])
+        if self.last_time is not None and t <= self.last_time:
+            return []
+        self.last_time = t
+
+        closed = []
+        for r, step in self.steps.items():
+            start = t - t % step
+            if start < self._closed_until[r]:
+                continue
+            cur = self.open[r]
+            if cur is not None and cur["time"] < start:
+                # its last 1m bar never came (no trades), close it as is
+                self._close(r, closed)
+                cur = None
+
+            volume = float(bar.get("volume", 0) or 0)
+            if cur is None:
+                self.open[r] = {
+                    "time": start,
+                    "open": float(bar["open"]),
+                    "high": float(bar["high"]),
+                    "low": float(bar["low"]),
+                    "close": float(bar["close"]),
+                    "volume": volume,
+                }
+            else:
+                cur["high"] = max(cur["high"], float(bar["high"]))
+                cur["low"] = min(cur["low"], float(bar["low"]))
+                cur["close"] = float(bar["close"])
+                cur["volume"] += volume
+
+            # the bucket's last 1m bar: the higher timeframe bar is complete
+            if t + self.base_step >= start + step:
+                self._close(r, closed)
+        return closed
+
+    def update_many(self, candles, now=None) -> list:
+        """
+        Feed get_candles style 1m bars, skipping any still forming at `now`.
+        """
+        closed = []
+        for c in sorted(candles, key=lambda c: int(c["time"])):
+            if now is not None and int(c["time"]) + self.base_step > now:
+                continue
+            closed.extend(self.update(c))
+        return closed
+
+    def candles(self, resolution: str, window: int, include_partial: bool = True) -> list:
+        """
+        Last `window` bars in get_candles format, the forming bar last
+        when include_partial (get_candles returns it too).
+        """
+        bars = list(self.closed[resolution])
+        if include_partial and self.open[resolution] is not None:
+            bars.append(dict(self.open[resolution]))
+        return bars[-window:]
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = args[0] if args else "BTCUSDT_data.csv"
+    resample_csv(path, args[1:] or RESOLUTIONS)
@@ -0,0 +1,212 @@
+import os
+import csv
+import json
+import time
+import pickle
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from config import SHADOW_REGISTRY, SHADOW_BUDGET_MS, SHADOW_LOG_FILE
+from model_registry import predict_raw
+
+SUPPORTED_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+def _keras_plan(model):
+    """
+    Describe a Sequential Dense / BatchNorm / Dropout model as a list of
+    numpy ops, or None if it has any other layer. Models with the same
+    signature can be evaluated together as one stacked forward pass.
+    """
+    if not hasattr(model, "layers"):
+        return None
+
+    signature = []
+    ops = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ("Dropout", "InputLayer"):
+            continue
+        if kind == "Dense":
+            act = layer.get_config().get("activation", "linear")
+            # serialized activations come back as dicts, treat them as unsupported
+            if not (isinstance(act, str) and act in SUPPORTED_ACTIVATIONS):
+                return None
+            weights = layer.get_weights()
+            if len(weights) != 2:
+                # Dense(use_bias=False)
+                return None
+            kernel, bias = weights
+            signature.append(("dense", kernel.shape, act))
+            ops.append(("dense", [kernel, bias], act))
+        elif kind == "BatchNormalization":
+            weights = layer.get_weights()
+            if len(weights) != 4:
+                return None
+            gamma, beta, mean, var = weights
+            # fold inference time batch norm into one scale and shift
+            scale = gamma / np.sqrt(var + layer.epsilon)
+            signature.append(("bn", gamma.shape))
+            ops.append(("bn", [scale, beta - mean * scale], None))
+        else:
+            return None
+    return tuple(signature), ops
+
+
+class _StackedKeras:
+    """
+    Several same architecture Keras models as one batched numpy forward
+    pass: weights are stacked on a leading model axis and every layer is
+    a single einsum, instead of one model.predict call per model.
+    """
+
+    def __init__(self, names, plans):
+        self.names = names
+        self.layers = []
+        for i, (kind, _, act) in enumerate(plans[0]):
+            stacked = [np.stack([p[i][1][j] for p in plans]) for j in range(2)]
+            self.layers.append((kind, stacked, act))
+
+    def predict(self, X):
+        x = np.broadcast_to(X, (len(self.names),) + X.shape).astype(np.float32)
+        for kind, (a, b), act in self.layers:
+            if kind == "dense":
+                x = np.einsum("mbi,mio->mbo", x, a) + b[:, None, :]
+                x = SUPPORTED_ACTIVATIONS[act](x)
+            else:
+                x = x * a[:, None, :] + b[:, None, :]
+        return dict(zip(self.names, x[:, 0, 0].astype(float).tolist()))
+
+
+class ShadowModels:
+    """
+    Registry of candidate models scored on the same feature vector as the
+    primary model. They never trade; their raw_pred is only logged.
+
+    Registry file format:
+        {"models": [{"name": "lgbm_v1", "path": "models/lgbm_v1.pkl"}, ...]}
+    """
+
+    def __init__(self, registry_path=SHADOW_REGISTRY, budget_ms=SHADOW_BUDGET_MS,
+                 log_file=SHADOW_LOG_FILE):
+        self.budget = budget_ms / 1000.0
+        self.log_file = log_file
+        self._log_lock = threading.Lock()
+        self.groups = []     # _StackedKeras, evaluated as one task each
+        self.singles = {}    # name -> model, evaluated one task each
+
+        models = self._load_registry(registry_path)
+
+        by_signature = {}
+        for name, m in models.items():
+            plan = _keras_plan(m)
+            if plan is None:
+                self.singles[name] = m
+            else:
+                by_signature.setdefault(plan[0], []).append((name, plan[1]))
+
+        for members in by_signature.values():
+            if len(members) == 1:
+                name = members[0][0]
+                self.singles[name] = models[name]
+            else:
+                self.groups.append(_StackedKeras([n for n, _ in members], [p for _, p in members]))
+
+        workers = max(1, len(self.groups) + len(self.singles))
+        self.pool = ThreadPoolExecutor(max_workers=min(workers, os.cpu_count() or 1),
+                                       thread_name_prefix="shadow")
+        self._pending = set()
+
+        if models:
+            print(f"Shadow models loaded: {len(models)} "
+                  f"({sum(len(g.names) for g in self.groups)} batched keras)")
+
+    @staticmethod
+    def _load_registry(path):
+        models = {}
+        if not path or not os.path.exists(path):
+            return models
+        with open(path, "r") as f:
+            entries = json.load(f).get("models", [])
+        for entry in entries:
+            try:
+                with open(entry["path"], "rb") as mf:
+                    models[entry["name"]] = pickle.load(mf)
+            except Exception as e:
+                print(f"Shadow model {entry.get('name')} load failed", e)
+        return models
+
+    def __bool__(self):
+        return bool(self.groups or self.singles)
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        preds = fn(*args)
+        return preds, (time.perf_counter() - start) * 1000
+
+    def _log(self, tick_time, preds, latency_ms, late):
+        with self._log_lock:
+            new_file = not os.path.exists(self.log_file)
+            with open(self.log_file, mode="a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["Timestamp", "Model", "RawPred", "LatencyMs", "Primary", "Late"])
+                for name, pred in preds.items():
+                    writer.writerow([
+                        tick_time.strftime("%Y-%m-%d %H:%M:%S"),
+                        name,
+                        pred,
+                        round(latency_ms, 3),
+                        int(name == "primary"),
+                        int(late),
+                    ])
+
+    def _on_late(self, tick_time, fut):
+        self._pending.discard(fut)
+        try:
+            preds, latency = fut.result()
+        except Exception as e:
+            print("Shadow model error", e)
+            return
+        self._log(tick_time, preds, latency, late=True)
+
+    def evaluate(self, X, primary_pred, primary_latency_ms=0.0):
+        """
+        Score every shadow model on X, waiting at most the latency budget.
+        Anything slower is logged when it finishes and never blocks the tick.
+        While any shadow from the previous tick is still running, this tick's
+        shadows are skipped, so a slow model cannot pile up work.
+        """
+        tick_time = datetime.now()
+        self._log(tick_time, {"primary": primary_pred}, primary_latency_ms, late=False)
+
+        if self._pending:
+            print(f"Shadow models still busy from last tick, skipping ({len(self._pending)})")
+            return
+
+        futures = [self.pool.submit(self._timed, g.predict, X) for g in self.groups]
+        futures += [
+            self.pool.submit(self._timed, lambda m=m, n=n: {n: float(predict_raw(m, X)[0])})
+            for n, m in self.singles.items()
+        ]
+
+        done, not_done = wait(futures, timeout=self.budget)
+        for fut in done:
+            try:
+                preds, latency = fut.result()
+            except Exception as e:
+                print("Shadow model error", e)
+                continue
+            self._log(tick_time, preds, latency, late=False)
+
+        for fut in not_done:
+            self._pending.add(fut)
+            fut.add_done_callback(lambda f, t=tick_time: self._on_late(t, f))
@@ -1,15 +1,43 @@
 # strategy_analysis.py
+import sys
 import numpy as np
 import pandas as pd
 
+from bucket_bootstrap import bootstrap_buckets, N_RESAMPLES, CONFIDENCE
+from metrics import MetricsAccumulator
+
 INPUT_FILE = "research_data.csv"
 BUCKETS = 10
 RESULT_BUCKET_STATS = "bucket_stats.csv"
 RESULT_EQUITY = "equity_curve.csv"
+RESULT_HORIZON_STATS = "bucket_stats_by_horizon.csv"
+
+
+def horizon_columns(df: pd.DataFrame) -> list:
+    """
+    future_return_{h} columns written by data_generation --multi, shortest first.
+    """
+    cols = [c for c in df.columns if c.startswith("future_return_")]
+    return sorted(cols, key=lambda c: int(c.rsplit("_", 1)[1]))
+
+
+def horizon_bucket_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bucket stats for every horizon column, stacked with a horizon level.
+    """
+    frames = {}
+    for col in horizon_columns(df):
+        h = int(col.rsplit("_", 1)[1])
+        frames[h] = df.dropna(subset=[col]).groupby("bucket")[col].agg(
+            mean_return="mean",
+            std_return="std",
+            count="count",
+        )
+    return pd.concat(frames, names=["horizon", "bucket"])
 
 
-def main():
-    df = pd.read_csv(INPUT_FILE, parse_dates=["time"])
+def main(input_file: str = INPUT_FILE):
+    df = pd.read_csv(input_file, parse_dates=["time"])
     df = df.sort_values("time").reset_index(drop=True)
     df = df.dropna(subset=["model_raw", "future_return"])
 
@@ -34,27 +62,46 @@ def main():
     bucket_stats.to_csv(RESULT_BUCKET_STATS)
     print(f"\nSaved bucket stats to {RESULT_BUCKET_STATS}")
 
+    if horizon_columns(df):
+        by_horizon = horizon_bucket_stats(df)
+        print("\nBucket stats per horizon (bars ahead):")
+        print(by_horizon)
+        print("\nTop bucket per horizon:")
+        print(by_horizon["mean_return"].groupby(level="horizon").idxmax().map(lambda k: k[1]))
+        by_horizon.to_csv(RESULT_HORIZON_STATS)
+        print(f"Saved per horizon bucket stats to {RESULT_HORIZON_STATS}")
+
     top_bucket = bucket_stats["mean_return"].idxmax()
     print(f"\nTop bucket by mean return: {top_bucket}")
 
+    ci, sharpe = bootstrap_buckets(df["bucket"].values, df["future_return"].values,
+                                   top_bucket=int(top_bucket))
+    print(f"\nBlock bootstrap ({N_RESAMPLES} resamples, {int(CONFIDENCE * 100)}% CI):")
+    print(ci[["ci_low", "ci_high", "p_best"]])
+    print(f"P(top bucket {top_bucket} is really best): {ci.loc[top_bucket, 'p_best']:.3f}")
+    print(f"Top bucket per bar Sharpe: {sharpe['sharpe']:.4f} "
+          f"[{sharpe['sharpe_ci_low']:.4f}, {sharpe['sharpe_ci_high']:.4f}]")
+
     df["position"] = (df["bucket"] == top_bucket).astype(int)
     df["strategy_return"] = df["position"] * df["future_return"]
-    df["equity"] = (1 + df["strategy_return"]).cumprod()
+
+    acc = MetricsAccumulator()
+    equity = np.empty(len(df))
+    for i, (ret, pos) in enumerate(zip(df["strategy_return"].values, df["position"].values)):
+        acc.update(ret, pos)
+        equity[i] = acc.equity
+    df["equity"] = equity
 
     equity_curve = df[["time", "equity", "strategy_return", "position"]]
     equity_curve.to_csv(RESULT_EQUITY, index=False)
 
-    total_return = equity_curve["equity"].iloc[-1] - 1
-    avg_ret = df["strategy_return"].mean()
-    win_rate = (df["strategy_return"] > 0).mean()
-    num_trades = df["position"].diff().fillna(0).ne(0).sum() / 2
-
     print("\nToy strategy results (top bucket long only):")
-    print(f"Total return: {total_return:.4f}")
-    print(f"Average bar return: {avg_ret:.6f}")
-    print(f"Win rate: {win_rate:.3f}")
-    print(f"Approx number of trades: {int(num_trades)}")
+    print(f"Total return: {acc.total_return:.4f}")
+    print(f"Average bar return: {acc.avg_return:.6f}")
+    print(f"Win rate: {acc.hit_rate:.3f}")
+    print(f"Number of trades: {acc.trades}")
+    print(f"Max drawdown: {acc.max_drawdown:.4f}")
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE)
@@ -2,6 +2,8 @@
 import numpy as np
 import pandas as pd
 
+from metrics import MetricsAccumulator
+
 INPUT_FILE = "research_data.csv"
 OUTPUT_FILE = "strategy_backtest.csv"
 
@@ -48,27 +50,22 @@ def main():
     short_entries = (df["pos_change"] == -1)
     df.loc[short_entries, "strategy_return"] = -df.loc[short_entries, "future_return"]
 
-    # equity curve from trade returns
-    df["equity"] = (1 + df["strategy_return"]).cumprod()
-
-    total_return = df["equity"].iloc[-1] - 1
-    avg_bar_ret = df["strategy_return"].mean()
-    win_rate = (df["strategy_return"] > 0).mean()
-
-    # count trades as entries
-    num_entries = int((long_entries | short_entries).sum())
-
-    # max drawdown
-    cummax_equity = df["equity"].cummax()
-    drawdown = (df["equity"] / cummax_equity) - 1
-    max_dd = drawdown.min()
+    # equity curve and risk metrics, streamed one bar at a time
+    acc = MetricsAccumulator()
+    equity = np.empty(len(df))
+    for i, (ret, pos) in enumerate(zip(df["strategy_return"].values, df["position"].values)):
+        acc.update(ret, pos)
+        equity[i] = acc.equity
+    df["equity"] = equity
 
     print("Strategy backtest results")
-    print(f"Total return: {total_return:.4f}")
-    print(f"Average bar return (entry bars only): {avg_bar_ret:.6f}")
-    print(f"Win rate (per trade): {win_rate:.3f}")
-    print(f"Number of trades: {num_entries}")
-    print(f"Max drawdown: {max_dd:.4f}")
+    print(f"Total return: {acc.total_return:.4f}")
+    print(f"Average bar return: {acc.avg_return:.6f}")
+    print(f"Win rate (per trade): {acc.hit_rate:.3f}")
+    print(f"Number of trades: {acc.trades}")
+    print(f"Max drawdown: {acc.max_drawdown:.4f}")
+    print(f"Sharpe (per bar): {acc.sharpe:.4f}")
+    print(f"Exposure: {acc.exposure:.3f}")
 
     df_out = df[
         [
@@ -0,0 +1,244 @@
+import gzip
+import json
+import time
+import atexit
+import threading
+from collections import defaultdict, deque
+
+import pandas as pd
+
+from config import TAPE_MODE, TAPE_FILE, TAPE_SPEED
+
+
+class TapeExhausted(BaseException):
+    """
+    Raised when a replay runs out of recorded responses.
+    Derives from BaseException so the broad `except Exception` retry
+    handlers in the live path end the session instead of spinning; the
+    background pollers catch it explicitly and stop.
+    """
+
+
+class _TapeResponse:
+    """
+    Minimal stand in for requests.Response built from a recorded entry.
+    """
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code} (replayed): {self.text[:200]}")
+
+
+def frame_to_json(df):
+    """
+    Column oriented json form of a DataFrame that keeps what the callers
+    rely on: column labels (including yfinance's MultiIndex), dtypes, and
+    a named, possibly tz aware, DatetimeIndex stored as epoch nanoseconds.
+    """
+    index = df.index
+    is_time = isinstance(index, pd.DatetimeIndex)
+    columns = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype.kind == "M":
+            col = col.dt.as_unit("ns").astype("int64")
+        columns.append(col.tolist())
+    return {
+        "columns": [list(c) if isinstance(c, tuple) else c for c in df.columns],
+        "column_names": list(df.columns.names),
+        "dtypes": [str(t) for t in df.dtypes],
+        "index": index.as_unit("ns").asi8.tolist() if is_time else index.tolist(),
+        "index_name": index.name,
+        "index_tz": str(index.tz) if is_time and index.tz is not None else None,
+        "index_unit": index.unit if is_time else None,
+        "index_is_time": is_time,
+        "data": columns,
+    }
+
+
+def frame_from_json(payload):
+    """
+    Inverse of `frame_to_json`.
+    """
+    labels = [tuple(c) if isinstance(c, list) else c for c in payload["columns"]]
+    names = payload["column_names"]
+    if len(names) > 1:
+        columns = pd.MultiIndex.from_tuples(labels, names=names)
+    else:
+        columns = pd.Index(labels, name=names[0])
+
+    if payload["index_is_time"]:
+        index = pd.to_datetime(payload["index"], unit="ns", utc=True)
+        if payload["index_tz"] is None:
+            index = index.tz_localize(None)
+        else:
+            index = index.tz_convert(payload["index_tz"])
+        index = index.as_unit(payload["index_unit"]).rename(payload["index_name"])
+    else:
+        index = pd.Index(payload["index"], name=payload["index_name"])
+
+    data = {}
+    for i, (values, dtype) in enumerate(zip(payload["data"], payload["dtypes"])):
+        if dtype.startswith("datetime64"):
+            unit = dtype[len("datetime64["):].split(",")[0].rstrip("]")
+            times = pd.Series(pd.to_datetime(values, unit="ns", utc=True)).dt.as_unit(unit)
+            if "," in dtype:
+                data[i] = times.dt.tz_convert(dtype.split(",", 1)[1].rstrip("]").strip())
+            else:
+                data[i] = times.dt.tz_localize(None)
+        else:
+            data[i] = pd.Series(values, dtype=dtype)
+    df = pd.DataFrame(data, index=range(len(index)))
+    df.columns = columns
+    df.index = index
+    return df
+
+
+class Tape:
+    """
+    Records every external response to a gzip compressed json lines file,
+    or feeds a recorded file back in place of the network.
+
+    Each entry carries the wall clock time it was received, a stable label
+    (for example "candles:BTCUSD:1m") and the raw payload. Replay serves
+    entries per label in recorded order, so a session replays the same way
+    even though request params such as start / end timestamps differ.
+    """
+
+    def __init__(self, mode="off", path=TAPE_FILE, speed="realtime"):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown tape mode: {mode}")
+
+        self.mode = mode
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._out = None
+        self._recording = False
+        self._queues = defaultdict(deque)
+        self._tape_start = None
+        self._replay_start = None
+
+        if mode == "replay":
+            self._load(path)
+            print(f"Replaying external responses from {path} ({speed})")
+
+    def _load(self, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if self._tape_start is None:
+                    self._tape_start = entry["t"]
+                self._queues[entry["label"]].append(entry)
+
+    def _write(self, label, kind, payload):
+        entry = {"t": time.time(), "label": label, "kind": kind, "payload": payload}
+        with self._lock:
+            if self._out is None:
+                self._open_for_write()
+            self._out.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._out.flush()
+
+    def _open_for_write(self):
+        # Opened on the first write rather than at import, so merely
+        # importing a module that touches the tape does not wipe the
+        # previous recording. One session per file: appending would mix
+        # sessions on replay, so only a reopen after close appends.
+        mode = "at" if self._recording else "wt"
+        self._out = gzip.open(self.path, mode, encoding="utf-8")
+        if not self._recording:
+            self._recording = True
+            atexit.register(self.close)
+            print(f"Recording external responses to {self.path}")
+
+    def _next(self, label):
+        with self._lock:
+            queue = self._queues.get(label)
+            if not queue:
+                raise TapeExhausted(f"No more recorded responses for {label}")
+            entry = queue.popleft()
+            if self._replay_start is None:
+                self._replay_start = time.time()
+
+        if self.speed == "realtime":
+            due = self._replay_start + (entry["t"] - self._tape_start)
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        return entry
+
+    def http(self, label, fetch):
+        """
+        Wrap one HTTP call. `fetch` performs the real request and returns a
+        requests.Response; in replay mode it is never called.
+        """
+        if self.mode == "replay":
+            payload = self._next(label)["payload"]
+            return _TapeResponse(payload["status"], payload["text"])
+
+        resp = fetch()
+        if self.mode == "record":
+            self._write(label, "http", {"status": resp.status_code, "text": resp.text})
+        return resp
+
+    def frame(self, label, fetch):
+        """
+        Wrap one call that returns a pandas DataFrame (yfinance downloads).
+        The frame is stored as plain json (see `frame_to_json`), so a tape
+        can be inspected and replaying one never executes code.
+        """
+        if self.mode == "replay":
+            entry = self._next(label)
+            if entry["kind"] != "frame_json":
+                raise ValueError(
+                    f"{label}: frame recorded as {entry['kind']!r}, re-record the tape"
+                )
+            return frame_from_json(entry["payload"])
+
+        data = fetch()
+        if self.mode == "record":
+            self._write(label, "frame_json", frame_to_json(data))
+        return data
+
+    def value(self, label, fetch, default=None):
+        """
+        Wrap a json serialisable value read from local state, such as the
+        position at session start. Replay returns the recorded value, or
+        `default` for tapes recorded without it.
+        """
+        if self.mode == "replay":
+            if label not in self._queues:
+                return default
+            return self._next(label)["payload"]
+
+        data = fetch()
+        if self.mode == "record":
+            self._write(label, "value", data)
+        return data
+
+    def sleep(self, seconds):
+        """
+        Loop pacing. Replay is paced by the recorded timestamps instead,
+        so this is a no op there.
+        """
+        if self.mode != "replay":
+            time.sleep(seconds)
+
+    def close(self):
+        with self._lock:
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+
+
+TAPE = Tape(TAPE_MODE, TAPE_FILE, TAPE_SPEED)
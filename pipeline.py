@@ -0,0 +1,388 @@
+# pipeline.py
+"""
+Research pipeline runner with a content addressed cache.
+
+Each stage runs its script inside its own cache directory, with its input
+files linked in, because the scripts read and write fixed file names in
+the working directory. A stage's cache key hashes its code (the script and
+every repo module it imports), its input files (including upstream
+outputs), the environment settings it reads and its parameters, so a stage
+only reruns when something it depends on changed. Old versions stay cached
+side by side under .pipeline_cache/<stage>/<key>/.
+
+    python pipeline.py                                   # everything
+    python pipeline.py strategy_backtest --set strategy_backtest.LONG_BUCKETS=[7,8]
+    python pipeline.py --force data_generation           # refresh Yahoo data
+    python pipeline.py strategy_analysis --publish .     # copy outputs here
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import ast
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT, ".pipeline_cache")
+
+
+class Stage:
+    def __init__(self, name, script, outputs, deps=None, files=None, code=None,
+                 entry=None, params=None, env=None, copies=None):
+        self.name = name
+        self.script = script                  # path relative to ROOT
+        self.outputs = outputs                # files the script writes to its cwd
+        self.deps = deps or {}                # upstream stage -> files it needs from it
+        self.files = files or []              # repo files linked into the run dir
+        self.copies = copies or []            # repo files copied in, for files still being written
+        self.code = code or [script]          # source files whose local imports feed the key
+        self.entry = entry                    # function to call, None runs as __main__
+        self.params = params or {}            # module constants set before entry runs
+        self.env = env or []                  # env vars read other than by name in its code
+
+
+# order book snapshots the live bot records (BOOK_FILE, relative to paper_trading/
+# like the bot's other files); data_generation reads them when BOOK_FEATURES is set
+BOOK_SNAPSHOTS = os.path.join("paper_trading", os.getenv("BOOK_FILE", "orderbook_snapshots.npy"))
+
+STAGES = [
+    Stage(
+        "historical_data", "data/historical_data.py",
+        outputs=["BTCUSDT_data.csv", "data_quality_report.csv"],
+    ),
+    Stage(
+        "macro_data", "data/macro_data.py",
+        outputs=["BTC_with_Gold_USD_minute.csv"],
+        deps={"historical_data": ["BTCUSDT_data.csv"]},
+    ),
+    Stage(
+        "data_generation", "paper_trading/data_generation.py",
+        outputs=["research_data.csv", "research_data.meta.json"],
+        files=["paper_trading/final_model.pkl"],
+        copies=[BOOK_SNAPSHOTS] if os.getenv("BOOK_FEATURES") else [],
+        entry="main",
+    ),
+    Stage(
+        "strategy_analysis", "paper_trading/strategy_analysis.py",
+        outputs=["bucket_stats.csv", "equity_curve.csv"],
+        deps={"data_generation": ["research_data.csv"]},
+        entry="main",
+    ),
+    Stage(
+        "strategy_backtest", "paper_trading/strategy_backtest.py",
+        outputs=["strategy_backtest.csv"],
+        deps={"data_generation": ["research_data.csv"]},
+        entry="main",
+    ),
+]
+
+# runs in the stage's cache dir: import the script, apply params, call entry
+_BOOTSTRAP = """
+import os, sys, json, runpy, importlib
+path, entry, params = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+sys.argv = [path]
+sys.path.insert(0, os.path.dirname(path))
+if entry == "-":
+    runpy.run_path(path, run_name="__main__")
+else:
+    mod = importlib.import_module(os.path.splitext(os.path.basename(path))[0])
+    for k, v in params.items():
+        setattr(mod, k, v)
+    getattr(mod, entry)()
+"""
+
+_hash_memo = {}
+
+
+def file_hash(path: str) -> str:
+    st = os.stat(path)
+    memo_key = (path, st.st_mtime_ns, st.st_size)
+    if memo_key not in _hash_memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _hash_memo[memo_key] = h.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def local_imports(path: str) -> list:
+    """
+    `path` plus every repo module it imports, directly or through other
+    repo modules, as paths relative to ROOT. Imports resolve in the
+    script's directory, which is first on sys.path when a stage runs.
+    """
+    base = os.path.dirname(path)
+    found, todo = set(), [path]
+    while todo:
+        rel = todo.pop()
+        if rel in found:
+            continue
+        found.add(rel)
+        with open(os.path.join(ROOT, rel), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=rel)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(base, name.split(".")[0] + ".py")
+                if os.path.exists(os.path.join(ROOT, candidate)):
+                    todo.append(candidate)
+    return sorted(found)
+
+
+def _env_name(node):
+    """
+    The variable name if `node` reads os.environ by a literal name,
+    as os.getenv("X"), os.environ.get("X") or os.environ["X"].
+    """
+    if isinstance(node, ast.Call) and node.args:
+        func, arg = node.func, node.args[0]
+        reads = (
+            (isinstance(func, ast.Attribute) and func.attr == "getenv")
+            or (isinstance(func, ast.Name) and func.id == "getenv")
+            or (isinstance(func, ast.Attribute) and func.attr == "get"
+                and isinstance(func.value, ast.Attribute) and func.value.attr == "environ")
+        )
+    elif isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load):
+        arg = node.slice
+        reads = isinstance(node.value, ast.Attribute) and node.value.attr == "environ"
+    else:
+        return None
+    if reads and isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+        return arg.value
+    return None
+
+
+def env_reads(paths) -> list:
+    """
+    Environment variables read by name anywhere in `paths`, so settings
+    that reach a stage through a shared module such as config.py are
+    part of its key without being listed by hand.
+    """
+    names = set()
+    for rel in paths:
+        with open(os.path.join(ROOT, rel), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=rel)
+        for node in ast.walk(tree):
+            name = _env_name(node)
+            if name:
+                names.add(name)
+    return sorted(names)
+
+
+# read into the key, but never written to a manifest in clear
+_SECRET_HINTS = ("KEY", "SECRET", "TOKEN", "PASSWORD")
+
+
+def _manifest_env(name: str) -> str:
+    value = os.getenv(name, "")
+    if value and any(hint in name.upper() for hint in _SECRET_HINTS):
+        return "<set>"
+    return value
+
+
+def _link(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class Pipeline:
+    def __init__(self, stages=STAGES, cache_dir=CACHE_DIR, workers=None):
+        self.stages = {s.name: s for s in stages}
+        self.cache_dir = cache_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.keys = {}
+
+    def _order(self, targets):
+        """
+        Targets plus everything upstream of them, dependencies first.
+        """
+        seen, order = set(), []
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            order.append(name)
+
+        for t in targets:
+            visit(t)
+        return order
+
+    def stage_env(self, stage):
+        """
+        Environment variables a stage depends on: every one its code
+        reads by name, plus any listed on the stage.
+        """
+        code = {f for path in stage.code for f in local_imports(path)}
+        return sorted(set(env_reads(code)) | set(stage.env))
+
+    def stage_dir(self, name):
+        return os.path.join(self.cache_dir, name, self.keys[name])
+
+    def cache_key(self, stage):
+        """
+        Hash of the stage's code and local imports, repo input files,
+        environment settings, parameters and the content of the upstream
+        outputs it reads. Computed once its
+        upstream stages are done, so a rerun upstream that produced the
+        same bytes still hits the cache downstream.
+        """
+        h = hashlib.sha256()
+        h.update(stage.name.encode())
+        code = sorted({f for path in stage.code for f in local_imports(path)})
+        for path in code + stage.files + stage.copies:
+            if not os.path.exists(os.path.join(ROOT, path)):
+                raise FileNotFoundError(f"{stage.name} needs {path}")
+            h.update(path.encode())
+            h.update(file_hash(os.path.join(ROOT, path)).encode())
+        for name in self.stage_env(stage):
+            h.update(f"{name}={os.getenv(name, '')}".encode())
+        for dep, files in sorted(stage.deps.items()):
+            with open(os.path.join(self.stage_dir(dep), "manifest.json"), "r") as f:
+                outputs = json.load(f)["outputs"]
+            for name in sorted(files):
+                h.update(f"{dep}/{name}:{outputs[name]}".encode())
+        h.update(json.dumps(stage.params, sort_keys=True).encode())
+        return h.hexdigest()[:16]
+
+    def is_cached(self, name):
+        d = self.stage_dir(name)
+        return os.path.exists(os.path.join(d, "manifest.json"))
+
+    def _run_stage(self, name):
+        stage = self.stages[name]
+        final_dir = self.stage_dir(name)
+        work_dir = final_dir + ".tmp"
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+
+        for path in stage.files:
+            _link(os.path.join(ROOT, path), os.path.join(work_dir, os.path.basename(path)))
+        for path in stage.copies:
+            shutil.copy2(os.path.join(ROOT, path), os.path.join(work_dir, os.path.basename(path)))
+        for dep, files in stage.deps.items():
+            for f in files:
+                _link(os.path.join(self.stage_dir(dep), f), os.path.join(work_dir, f))
+
+        start = time.time()
+        cmd = [sys.executable, "-c", _BOOTSTRAP, os.path.join(ROOT, stage.script),
+               stage.entry or "-", json.dumps(stage.params)]
+        with open(os.path.join(work_dir, "stage.log"), "w") as log:
+            proc = subprocess.run(cmd, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{name} failed, see {os.path.join(work_dir, 'stage.log')}")
+
+        missing = [o for o in stage.outputs if not os.path.exists(os.path.join(work_dir, o))]
+        if missing:
+            raise RuntimeError(f"{name} did not write {missing}")
+
+        manifest = {
+            "stage": name,
+            "key": self.keys[name],
+            "params": stage.params,
+            "env": {name: _manifest_env(name) for name in self.stage_env(stage)},
+            "outputs": {o: file_hash(os.path.join(work_dir, o)) for o in stage.outputs},
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "seconds": round(time.time() - start, 2),
+        }
+        with open(os.path.join(work_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.rename(work_dir, final_dir)
+        return manifest
+
+    def run(self, targets=None, force=()):
+        """
+        Bring targets up to date. Stages whose dependencies are done and
+        whose key is not cached run in parallel; stages in `force` rerun
+        and replace their cached version for the current key.
+        """
+        targets = targets or list(self.stages)
+        pending = self._order(targets)
+        done = set()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                ready = [n for n in pending if all(d in done for d in self.stages[n].deps)]
+                for n in ready:
+                    pending.remove(n)
+                    self.keys[n] = self.cache_key(self.stages[n])
+                    if n not in force and self.is_cached(n):
+                        print(f"[cached] {n} {self.keys[n]}")
+                        done.add(n)
+                        continue
+                    print(f"[run]    {n} {self.keys[n]}")
+                    running[pool.submit(self._run_stage, n)] = n
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    n = running.pop(fut)
+                    manifest = fut.result()
+                    print(f"[done]   {n} {self.keys[n]} in {manifest['seconds']}s")
+                    done.add(n)
+
+        return {n: self.stage_dir(n) for n in self._order(targets)}
+
+    def publish(self, targets, dest):
+        os.makedirs(dest, exist_ok=True)
+        for name in targets:
+            for o in self.stages[name].outputs:
+                shutil.copy2(os.path.join(self.stage_dir(name), o), os.path.join(dest, o))
+                print(f"Published {name}/{o} to {dest}")
+
+
+def _parse_set(values, stages):
+    for item in values:
+        lhs, value = item.split("=", 1)
+        stage, const = lhs.split(".", 1)
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError:
+            parsed = value
+        stages[stage].params[const] = parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the research pipeline with caching")
+    parser.add_argument("targets", nargs="*", help="stages to bring up to date (default all)")
+    parser.add_argument("--set", action="append", default=[],
+                        help="stage.CONSTANT=value, value parsed as json when possible")
+    parser.add_argument("--force", action="append", default=[],
+                        help="rerun this stage even if cached (e.g. to refresh downloads)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--publish", default=None, help="copy target outputs to this dir")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(workers=args.workers)
+    _parse_set(args.set, pipeline.stages)
+    targets = args.targets or list(pipeline.stages)
+
+    dirs = pipeline.run(targets, force=set(args.force))
+    for name in targets:
+        print(f"{name}: {dirs[name]}")
+
+    if args.publish:
+        pipeline.publish(targets, args.publish)
+
+
+if __name__ == "__main__":
+    main()